@@ -0,0 +1,218 @@
+# battlestate.py
+# State of the battles followed by a Pokemon Online client
+#
+# Licensed under BSD-style license.
+# See LICENSE for details
+
+"""
+BattleState folds the battle commands of one battle into per spot
+arrays: hp, status number, stat boosts and hazards, plus the current turn.
+BattleStates keeps one BattleState per battle id and is fed by
+POClient.handleBattleCommand with the parsed commands.
+
+    client.battleStates = BattleStates()
+    ...
+    state = client.battleStates[battleid]
+    state.hp[spot], state.boost(spot, 1), state.hazardNames(spot)
+"""
+
+import array
+from collections import OrderedDict
+
+from protocol import BattleDynamicInfo
+
+# boosted stats are Attack (1) to Evasion (7), as in BattleDynamicInfo.boosts
+BOOSTS = 7
+
+# status numbers of StatusChange: Fine (0) to Poisoned (5), and Koed
+KOED = 31
+
+def statusOf(fullStatus):
+    """
+    The status number of StatusChange for the fullStatus bitmask of a
+    ShallowBattlePoke, where status n is bit n
+    """
+    if fullStatus & (1 << KOED):
+        return KOED
+    fullStatus &= 0x3F
+    status = 0
+    while fullStatus > 1:
+        fullStatus >>= 1
+        status += 1
+    return status
+
+class BattleState(object):
+
+    # per spot columns and their array typecodes
+    columns = (
+        ('hp', 'H'),
+        ('status', 'i'),
+        ('ko', 'B'),
+        ('substitute', 'B'),
+        ('vanished', 'B'),
+        ('hazards', 'B'))
+
+    def __init__(self, battleid, spots=2):
+        self.id = battleid
+        self.turn = 0
+        self.result = None
+        self.spots = 0
+        for name, typecode in self.columns:
+            setattr(self, name, array.array(typecode))
+        self.boosts = array.array('b')
+        self.pokes = []
+        self.grow(spots)
+
+    def grow(self, spots):
+        """ Makes room for spots spots """
+        more = spots - self.spots
+        if more <= 0:
+            return
+        for name, typecode in self.columns:
+            getattr(self, name).extend([0] * more)
+        self.boosts.extend([0] * (BOOSTS * more))
+        self.pokes.extend([None] * more)
+        self.spots = spots
+
+    def apply(self, command, spot, args):
+        """ Applies the parsed battle command, commands not affecting the state are ignored """
+        apply = self.appliers.get(command)
+        if apply is not None:
+            if spot >= self.spots:
+                self.grow(spot + 1)
+            apply(self, spot, *args)
+
+    def snapshot(self):
+        """ A copy of the state, later commands do not change it """
+        copy = BattleState.__new__(BattleState)
+        copy.id = self.id
+        copy.turn = self.turn
+        copy.result = self.result
+        copy.spots = self.spots
+        for name, typecode in self.columns:
+            setattr(copy, name, getattr(self, name)[:])
+        copy.boosts = self.boosts[:]
+        copy.pokes = self.pokes[:]
+        return copy
+
+    def boost(self, spot, stat):
+        """ Boost of stat (1 = Attack ... 7 = Evasion) of the pokemon in spot """
+        return self.boosts[spot*BOOSTS + stat - 1]
+
+    def hazardNames(self, spot):
+        flags = self.hazards[spot]
+        return [name for flag, name in sorted(BattleDynamicInfo.Flags.items()) if flags & flag]
+
+    def resetSpot(self, spot):
+        self.ko[spot] = 0
+        self.substitute[spot] = 0
+        self.vanished[spot] = 0
+        start = spot * BOOSTS
+        self.boosts[start:start+BOOSTS] = array.array('b', [0] * BOOSTS)
+
+    #### COMMANDS
+
+    def onSendOut(self, spot, silent, prevIndex, poke):
+        self.resetSpot(spot)
+        self.pokes[spot] = poke
+        if poke is not None:
+            self.hp[spot] = poke.lifePercent
+            self.status[spot] = statusOf(poke.fullStatus)
+
+    def onSendBack(self, spot):
+        self.resetSpot(spot)
+        self.pokes[spot] = None
+
+    def onBeginTurn(self, spot, turn):
+        self.turn = turn
+
+    def onChangeHp(self, spot, hp):
+        self.hp[spot] = hp
+
+    def onKo(self, spot):
+        self.hp[spot] = 0
+        self.ko[spot] = 1
+
+    def onStatChange(self, spot, stat, boost):
+        if 1 <= stat <= BOOSTS:
+            k = spot*BOOSTS + stat - 1
+            self.boosts[k] = max(-6, min(6, self.boosts[k] + boost))
+
+    def onStatusChange(self, spot, status, multiturn):
+        self.status[spot] = status
+
+    def onSubstitute(self, spot, isSub):
+        self.substitute[spot] = 1 if isSub else 0
+
+    def onDynamicInfo(self, spot, info):
+        start = spot * BOOSTS
+        self.boosts[start:start+BOOSTS] = array.array('b', info.boosts)
+        self.hazards[spot] = info.flags
+
+    def onTempPokeChange(self, spot, change, *args):
+        if change == "PokemonVanish":
+            self.vanished[spot] = 1
+        elif change == "PokemonReappear":
+            self.vanished[spot] = 0
+
+    def onSpotShifts(self, spot, s1, s2, silent):
+        self.grow(max(s1, s2) + 1)
+        for name, typecode in self.columns:
+            column = getattr(self, name)
+            column[s1], column[s2] = column[s2], column[s1]
+        self.pokes[s1], self.pokes[s2] = self.pokes[s2], self.pokes[s1]
+        b1, b2 = s1 * BOOSTS, s2 * BOOSTS
+        boosts1 = self.boosts[b1:b1+BOOSTS]
+        self.boosts[b1:b1+BOOSTS] = self.boosts[b2:b2+BOOSTS]
+        self.boosts[b2:b2+BOOSTS] = boosts1
+
+    def onBattleEnd(self, spot, result):
+        self.result = result
+
+BattleState.appliers = dict((name[2:], func) for name, func in vars(BattleState).items()
+                            if name.startswith("on") and callable(func))
+
+class BattleStates(object):
+    """
+    BattleState of every battle followed, by battle id.
+    The ids of the last finished battles are remembered, so commands
+    arriving late for them, e.g. from a BattleShards worker, don't
+    create their state again.
+    """
+
+    def __init__(self, spots=2, remember=4096):
+        self.spots = spots
+        self.states = {}
+        self.remember = remember
+        self.finished = OrderedDict()
+
+    def __getitem__(self, battleid):
+        return self.states[battleid]
+
+    def __contains__(self, battleid):
+        return battleid in self.states
+
+    def __len__(self):
+        return len(self.states)
+
+    def apply(self, command, battleid, spot, args):
+        state = self.states.get(battleid)
+        if state is None:
+            if battleid in self.finished:
+                return
+            state = self.states[battleid] = BattleState(battleid, self.spots)
+        state.apply(command, spot, args)
+
+    def start(self, battleid):
+        """ The battle is followed (again), its commands are applied """
+        self.finished.pop(battleid, None)
+
+    def remove(self, battleid):
+        """ The battle is over, its state is dropped """
+        self.states.pop(battleid, None)
+        self.finished[battleid] = True
+        if len(self.finished) > self.remember:
+            self.finished.popitem(last=False)
+
+    def snapshot(self, battleid):
+        return self.states[battleid].snapshot()
@@ -0,0 +1,119 @@
+# bench_decode_number.py
+# Micro-benchmark for PODecoder primitive decoding on a PlayersList burst
+#
+# Usage: python benchmarks/bench_decode_number.py [players] [repeat]
+
+import os
+import sys
+import time
+import struct
+import codecs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from protocol import PODecoder, NetworkEvents, PlayerInfo, Color, version_controlled
+
+def encode_string(ustr):
+    b = codecs.lookup("utf_8").encode(ustr)[0]
+    return struct.pack("!I", len(b)) + b
+
+def encode_player(pid):
+    """ PlayerInfo as sent by the server, version_controlled header included """
+    body = struct.pack("!B", 0) # structure version
+    body += struct.pack("!iBB", pid, 0, pid % 2)
+    body += encode_string(u"player%d" % pid)
+    body += struct.pack("!bHHHHH", 1, 255, pid % 256, 128, 64, 0)
+    body += struct.pack("!H", pid % 300)
+    body += encode_string(u"Trainer info of player %d" % pid)
+    body += struct.pack("!bB", pid % 4, 2)
+    body += encode_string(u"OU") + struct.pack("!h", 1000 + pid % 500)
+    body += encode_string(u"Ubers") + struct.pack("!h", 1000)
+    return struct.pack("!H", len(body)) + body
+
+def players_list_burst(players):
+    return struct.pack("!B", NetworkEvents['PlayersList']) + \
+        "".join(encode_player(pid) for pid in xrange(1, players+1))
+
+class LegacyDecoder(PODecoder):
+    """
+    decode_number as it was before the Struct cache, and PlayerInfo
+    decoded field by field as it was before the compiled schemas
+    """
+
+    def decode_number(self, fmt):
+        if fmt[0] != "!":
+            fmt = "!%s" % fmt
+        l = struct.calcsize(fmt)
+        if len(self.cmd) >= self.i+l:
+            n = struct.unpack(fmt, self.cmd[self.i:self.i+l])[0]
+        else:
+            n = 0
+        self.i+=l
+        return n
+
+    def decode_struct(self, fmt):
+        return tuple(self.decode_number(c) for c in fmt)
+
+    def decode_color(self):
+        color = Color()
+        color.color_spec = self.decode_number("b")
+        color.alpha = self.decode_number("H")
+        color.red = self.decode_number("H")
+        color.green = self.decode_number("H")
+        color.blue = self.decode_number("H")
+        color.pad = self.decode_number("H")
+        return color
+
+    @version_controlled(0)
+    def decode_PlayerInfo(self):
+        player = PlayerInfo()
+        player.id = self.decode_number("i")
+        # network flags: none
+        network_flags = self.decode_flags()
+        # data flags: away, hasLadder
+        data_flags = self.decode_flags()
+        player.away = data_flags & 1 > 0
+        player.hasLadder = data_flags & 2 > 0
+        player.name = self.decode_string()
+        player.color = self.decode_color()
+        player.avatar = self.decode_number("H")
+        player.info = self.decode_string()
+        player.auth = self.decode_number("b")
+        teamcount = self.decode_number("B")
+        player.teams = []
+        for k in range(teamcount):
+            tier = self.decode_string()
+            rating = self.decode_number("h")
+            player.teams.append({'tier': tier, 'rating': rating})
+        return player
+
+def decode_burst(decoder_class, frame):
+    decoder = decoder_class(frame)
+    decoder.decode_number("B")
+    players = []
+    while decoder.i < len(frame):
+        players.append(decoder.decode_PlayerInfo())
+    return players
+
+def bench(decoder_class, frame, repeat):
+    best = None
+    for k in xrange(repeat):
+        start = time.time()
+        decode_burst(decoder_class, frame)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(players=5000, repeat=5):
+    frame = players_list_burst(players)
+    assert [(p.name, p.teams) for p in decode_burst(PODecoder, frame)] == \
+           [(p.name, p.teams) for p in decode_burst(LegacyDecoder, frame)]
+    legacy = bench(LegacyDecoder, frame, repeat)
+    cached = bench(PODecoder, frame, repeat)
+    print("PlayersList burst: %d players, %d bytes" % (players, len(frame)))
+    print("legacy decoding:      %.2f ms" % (legacy * 1000))
+    print("Struct cache, schema: %.2f ms" % (cached * 1000))
+    print("speedup:              %.2fx" % (legacy / cached))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
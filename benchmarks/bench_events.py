@@ -0,0 +1,118 @@
+# bench_events.py
+# Decode throughput of every event and battle command
+#
+# Usage: python benchmarks/bench_events.py [--frames N] [--repeat N]
+#                                          [--capture FILE] [--json FILE]
+#
+# Frames come from corpus.py, or from a capture file recorded with
+# capture.Recorder. Results are printed as a table, and written as json
+# with --json (- for stdout) to compare runs against each other.
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import corpus
+from protocol import POClient, NetworkEvents, BattleCommands
+
+class Client(POClient):
+    """ POClient with no-op handlers, for the events it doesn't handle too """
+
+    def on_NotImplemented(self, ev, cmd):
+        pass
+
+    def on_ProtocolError(self, ev, cmd):
+        pass
+
+    def native_send(self, data):
+        pass
+
+class Null(object):
+    # swallows what the parsers print for incomplete commands
+    def write(self, data):
+        pass
+
+def run(call, items, count, repeat):
+    """ Best time of count calls of call(item), cycling through items """
+    items = (items * (count // len(items) + 1))[:count]
+    best = None
+    for k in xrange(repeat):
+        start = time.time()
+        for item in items:
+            call(item)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, sum(len(item) for item in items)
+
+def result(kind, name, frames, size, seconds):
+    return {
+        'kind': kind,
+        'name': name,
+        'frames': frames,
+        'bytes': size,
+        'seconds': seconds,
+        'frames_per_second': frames / seconds if seconds else None,
+        'bytes_per_second': size / seconds if seconds else None,
+    }
+
+def bench(events, commands, count, repeat):
+    results = []
+    stdout, sys.stdout = sys.stdout, Null()
+    try:
+        for name in sorted(events, key=lambda name: NetworkEvents.get(name, 256)):
+            client = Client()
+            seconds, size = run(client.stringReceived, events[name], count, repeat)
+            results.append(result('event', name, count, size, seconds))
+        for name in sorted(commands, key=lambda name: BattleCommands.get(name, 256)):
+            client = Client()
+            handle = lambda command: client.handleBattleCommand(1, command)
+            seconds, size = run(handle, commands[name], count, repeat)
+            results.append(result('battle', name, count, size, seconds))
+    finally:
+        sys.stdout = stdout
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode throughput of every event and battle command")
+    parser.add_argument("--frames", type=int, default=2000, help="frames decoded per event and run")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per event, the best one counts")
+    parser.add_argument("--capture", help="take the frames from a capture file")
+    parser.add_argument("--json", help="write the results as json to this file, - for stdout")
+    args = parser.parse_args()
+
+    if args.capture:
+        events, commands = corpus.load(args.capture)
+    else:
+        events, commands = corpus.events(), corpus.battle_commands()
+    results = bench(events, commands, args.frames, args.repeat)
+
+    out = sys.stderr if args.json == "-" else sys.stdout
+    out.write("%-8s %-26s %14s %14s\n" % ("kind", "name", "frames/s", "MB/s"))
+    for r in results:
+        out.write("%-8s %-26s %14.0f %14.2f\n" % (r['kind'], r['name'], r['frames_per_second'] or 0,
+                                                  (r['bytes_per_second'] or 0) / 1e6))
+    if args.json:
+        report = {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'time': time.time(),
+            'source': args.capture or "corpus",
+            'frames': args.frames,
+            'repeat': args.repeat,
+            'results': results,
+        }
+        if args.json == "-":
+            json.dump(report, sys.stdout, indent=1, sort_keys=True)
+            sys.stdout.write("\n")
+        else:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=1, sort_keys=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# bench_struct_memory.py
+# Memory held by decoded PlayerInfo structs, __slots__ classes against plain ones
+#
+# Usage: python benchmarks/bench_struct_memory.py [players]
+#
+# The footprint is what decoding the players grows the resident size of
+# the process by, their strings, lists and dicts included. tracemalloc
+# measures it where python has it. Both sets of players are kept alive,
+# so the second one can't reuse the memory of the first.
+
+import os
+import gc
+import sys
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from protocol import PODecoder, PlayerInfo, Color, PlayerInfoSchema, ColorSchema
+from schema import Schema
+from bench_decode_number import players_list_burst, decode_burst
+from loadgen import rss
+
+def plain(cls):
+    """ cls without __slots__, every instance gets a __dict__ """
+    return type("Plain%s" % cls.__name__, (object,), {'__init__': cls.__dict__['__init__']})
+
+class PlainDecoder(PODecoder):
+    """ Decodes PlayerInfo and Color into plain classes """
+
+    decode_PlayerInfo = Schema('PlayerInfo', plain(PlayerInfo), PlayerInfoSchema.fields, version=0).compile()
+    decode_Color = Schema('Color', plain(Color), ColorSchema.fields).compile()
+
+def measure(decoder_class, frame):
+    """ Bytes allocated for the decoded players, kept alive while measuring """
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        players = decode_burst(decoder_class, frame)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    else:
+        before = rss()
+        players = decode_burst(decoder_class, frame)
+        size = rss() - before
+    return players, size
+
+def main(players=10000):
+    frame = players_list_burst(players)
+    plainPlayers, plainSize = measure(PlainDecoder, frame)
+    slottedPlayers, slottedSize = measure(PODecoder, frame)
+    print("PlayersList burst: %d players, %d bytes" % (players, len(frame)))
+    if tracemalloc is None:
+        print("tracemalloc not available, growth of the resident size of the process")
+    print("plain classes: %8d bytes, %6.1f per player" % (plainSize, plainSize / float(players)))
+    print("__slots__:     %8d bytes, %6.1f per player" % (slottedSize, slottedSize / float(players)))
+    print("saved:         %8d bytes, %5.1f%%" % (plainSize - slottedSize, 100.0 * (plainSize - slottedSize) / plainSize))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
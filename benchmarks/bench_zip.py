@@ -0,0 +1,66 @@
+# bench_zip.py
+# Bandwidth and CPU cost of receiving a PlayersList burst as ZipCommand
+#
+# Usage: python benchmarks/bench_zip.py [players] [repeat]
+
+import os
+import sys
+import time
+import zlib
+import struct
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from protocol import POClient, NetworkEvents
+from bench_decode_number import players_list_burst
+
+# link speeds in bytes per second
+LINKS = [("256 kbit/s", 256000 / 8), ("2 Mbit/s", 2000000 / 8), ("20 Mbit/s", 20000000 / 8)]
+
+class Client(POClient):
+    def onPlayersList(self, players):
+        self.players += len(players)
+
+def zip_command(frames, level):
+    """ ZipCommand carrying the frames, as the server compresses them """
+    data = "".join(struct.pack("!I", len(frame)) + frame for frame in frames)
+    return struct.pack("!BBI", NetworkEvents['ZipCommand'], 1, len(data)) + zlib.compress(data, level)
+
+def receive(frames, repeat):
+    best = None
+    for k in xrange(repeat):
+        client = Client()
+        client.players = 0
+        start = time.time()
+        for frame in frames:
+            client.stringReceived(frame)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, client.players
+
+def main(players=5000, repeat=5):
+    # the server sends the roster in bursts of a few hundred players
+    burst = 250
+    frames = [players_list_burst(min(burst, players - k)) for k in xrange(0, players, burst)]
+    raw = sum(4 + len(frame) for frame in frames)
+    plain, received = receive(frames, repeat)
+    assert received == players
+    print("PlayersList: %d players in %d frames" % (players, len(frames)))
+    print("%-8s %10s %8s %12s %12s  %s" % ("level", "bytes", "ratio", "compress ms", "receive ms",
+                                            "  ".join("%12s" % name for name, speed in LINKS)))
+    rows = [("plain", raw, 0.0, plain)]
+    for level in (1, 6, 9):
+        start = time.time()
+        zipped = zip_command(frames, level)
+        compress = time.time() - start
+        cpu, received = receive([zipped], repeat)
+        assert received == players
+        rows.append(("zlib %d" % level, 4 + len(zipped), compress, cpu))
+    for name, size, compress, cpu in rows:
+        # time until the whole roster is handled: transfer plus decoding
+        totals = ["%10.1f ms" % ((size / float(speed) + cpu) * 1000) for link, speed in LINKS]
+        print("%-8s %10d %7.1f%% %12.2f %12.2f  %s" % (name, size, 100.0 * size / raw,
+                                                      compress * 1000, cpu * 1000, "  ".join(totals)))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
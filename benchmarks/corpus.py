@@ -0,0 +1,174 @@
+# corpus.py
+# Frames of every event and battle command, as a server sends them
+#
+# Used by the benchmarks, see bench_events.py
+
+import zlib
+import struct
+
+from protocol import NetworkEvents, BattleCommands, TempPokeChange
+from bench_decode_number import encode_string, encode_player, players_list_burst
+
+def pack(fmt, *values):
+    return struct.pack("!" + fmt, *values)
+
+def encode_bytes(data):
+    return pack("I", len(data)) + data
+
+def version_controlled(body, version=0):
+    body = pack("B", version) + body
+    return pack("H", len(body)) + body
+
+def encode_battle_configuration(rated=True):
+    return pack("BBBBI", 0, 1 if rated else 0, 5, 0, 0x20) + pack("ii", 17, 42)
+
+def encode_poke_battle(k):
+    body = pack("HB", 25 + k, 0) + pack("B", k % 2)
+    body += encode_string(u"Poke%d" % k)
+    body += pack("HHBBHHB", 300, 250 - k, 1, 100, 200 + k, 9, 255)
+    body += pack("5H", 200, 180, 220, 190, 250)
+    body += "".join(pack("HBB", 85 + m, 15, 15) for m in xrange(4))
+    body += pack("6B", 85, 85, 85, 85, 85, 85) + pack("6B", 31, 31, 31, 31, 31, 31)
+    return version_controlled(body)
+
+def encode_team_battle():
+    return "".join(encode_poke_battle(k) for k in xrange(6))
+
+def encode_shallow_battle_poke(k):
+    return pack("HB", 25 + k, 0) + encode_string(u"Poke%d" % k) + pack("BIBBB", 100, 0, 1, 0, 100)
+
+def event(name, payload=""):
+    return pack("B", NetworkEvents[name]) + payload
+
+def battle_command(name, spot, payload=""):
+    return pack("BB", BattleCommands[name], spot) + payload
+
+def battle_commands():
+    """ {battle command name: list of commands}, message number and spot included """
+    c = {
+        'SendOut': [pack("BB", 0, k) + encode_shallow_battle_poke(k) for k in xrange(6)],
+        'SendBack': [""],
+        'UseAttack': [pack("H", 85), pack("H", 94)],
+        'OfferChoice': [""],
+        'BeginTurn': [pack("i", turn) for turn in xrange(1, 4)],
+        'ChangePP': [""],
+        'ChangeHp': [pack("H", hp) for hp in (100, 57, 3)],
+        'Ko': [""],
+        'Effective': [pack("B", 8), pack("B", 2)],
+        'Miss': [""],
+        'CriticalHit': [""],
+        'Hit': [""],
+        'StatChange': [pack("bb", 1, 2), pack("bb", 5, -1)],
+        'StatusChange': [pack("bB", 2, 0), pack("bB", -1, 1)],
+        'StatusMessage': [pack("b", k) for k in xrange(10)],
+        'Failed': [pack("B", 0)],
+        'BattleChat': [encode_string(u"player1: good luck, have fun")],
+        'MoveMessage': [pack("HBbbh", 85, 0, 12, 1, 0) + encode_string(u"")],
+        'ItemMessage': [pack("HBbHH", 234, 1, 0, 0, 0)],
+        'NoOpponent': [""],
+        'Flinch': [""],
+        'Recoil': [pack("B", 33)],
+        'WeatherMessage': [pack("BB", 0, 2), pack("BB", 2, 3)],
+        'StraightDamage': [pack("H", 40)],
+        'AbilityMessage': [pack("HBbbh", 22, 0, 0, 1, 0)],
+        'AbsStatusChange': [pack("bb", 2, 3)],
+        'Substitute': [pack("b", 1)],
+        'BattleEnd': [pack("b", 1)],
+        'BlankMessage': [""],
+        'CancelMove': [""],
+        'Clause': [""],
+        'DynamicInfo': [pack("7bB", 1, 0, -1, 0, 2, 0, 0, 9)],
+        'DynamicStats': [pack("5h", 200, 180, 220, 190, 250)],
+        'Spectating': [pack("bi", 1, 7) + encode_string(u"watcher7")],
+        'SpectatorChat': [pack("i", 7) + encode_string(u"nice crit")],
+        'AlreadyStatusMessage': [pack("B", 2)],
+        'TempPokeChange': [pack("Bbh", TempPokeChange['TempMove'], 1, 94),
+                           pack("BBB", TempPokeChange['TempPP'], 1, 5)],
+        'ClockStart': [pack("H", 300)],
+        'ClockStop': [pack("H", 280)],
+        'Rated': [pack("B", 1)],
+        'TierSection': [encode_string(u"OU")],
+        'EndMessage': [encode_string(u"gg")],
+        'PointEstimate': [pack("BB", 12, 9)],
+        'MakeYourChoice': [""],
+        'Avoid': [""],
+        'RearrangeTeam': ["".join(pack("HBBBB", 25 + k, 0, 100, 1, 1) for k in xrange(6))],
+        'SpotShifts': [pack("BBB", 0, 2, 0)],
+    }
+    return dict((name, [battle_command(name, k % 2, payload) for k, payload in enumerate(payloads)])
+                for name, payloads in c.iteritems())
+
+def events():
+    """ {event name: list of frames}, frames without the length prefix """
+    chat = [u"player%d: message number %d of the channel" % (k, k) for k in xrange(8)]
+    hp = battle_command('ChangeHp', 1, pack("H", 57))
+    zipped = "".join(encode_bytes(event('Away', pack("iB", k, k % 2))) for k in xrange(50))
+    e = {
+        'ZipCommand': [pack("BI", 1, len(zipped)) + zlib.compress(zipped)],
+        'Login': [pack("B", 0) + encode_player(1) + pack("I", 3) +
+                  "".join(encode_string(tier) for tier in (u"OU", u"Ubers", u"LC"))],
+        'Logout': [pack("i", k) for k in xrange(1, 4)],
+        'SendMessage': [pack("BBI", 1, 0, 0) + encode_string(message) for message in chat] +
+                       [pack("BBII", 3, 0, 0, 5) + encode_string(u"message with id")],
+        'PlayersList': [players_list_burst(50)[1:]],
+        'SendTeam': [encode_player(k) for k in xrange(1, 4)],
+        'ChallengeStuff': [pack("biIBBB", 1, 7, 0x20, 0, 0, 5) + encode_string(u"OU") + encode_string(u"OU")],
+        'EngageBattle': [pack("iii", 9, 3, 4),
+                         pack("iii", 10, 0, 4) + encode_battle_configuration() + encode_team_battle()],
+        'BattleFinished': [pack("iBii", 9, 1, 3, 4)],
+        'BattleMessage': [pack("i", 10) + encode_bytes(hp)],
+        'KeepAlive': [""],
+        'AskForPass': [encode_string(u"salt1234salt1234")],
+        'Register': [""],
+        'PlayerKick': [pack("ii", 5, 1)],
+        'PlayerBan': [pack("ii", 5, 1)],
+        'SendPM': [pack("i", 5) + encode_string(u"hello there")],
+        'Away': [pack("iB", k, k % 2) for k in xrange(1, 5)],
+        'SpectateBattle': [pack("i", 12) + encode_battle_configuration()],
+        'SpectatingBattleMessage': [pack("i", 12) + encode_bytes(hp)],
+        'SpectatingBattleFinished': [pack("i", 12)],
+        'VersionControl': [pack("HHBHHHHHH", 2, 0, 1, 2, 0, 1, 0, 1, 0) + encode_string(u"Server")],
+        'TierSelection': [encode_bytes("".join(pack("B", level) + encode_string(name) for level, name in
+                                               ((0, u"All"), (1, u"OU"), (1, u"Ubers"), (2, u"LC"))))],
+        'Announcement': [encode_string(u"<b>Welcome</b> to the server " * 4)],
+        'BattleList': [pack("iI", 0, 20) + "".join(pack("iii", 100 + k, 2*k + 1, 2*k + 2) for k in xrange(20))],
+        'ChannelsList': [pack("I", 20) + "".join(pack("i", k) + encode_string(u"Channel %d" % k) for k in xrange(20))],
+        'ChannelPlayers': [pack("iI", 0, 100) + pack("100i", *xrange(1, 101))],
+        'JoinChannel': [pack("ii", 0, k) for k in xrange(1, 4)],
+        'LeaveChannel': [pack("ii", 0, k) for k in xrange(1, 4)],
+        'ChannelBattle': [pack("iiii", 0, 100 + k, 2*k + 1, 2*k + 2) for k in xrange(3)],
+        'RemoveChannel': [pack("i", 3)],
+        'AddChannel': [encode_string(u"Tournaments") + pack("i", 3)],
+        'ChannelMessage': [pack("i", 0) + encode_string(message) for message in chat],
+        'HtmlChannel': [pack("i", 0) + encode_string(u"<font color=red>notice</font>")],
+    }
+    frames = {}
+    for name in NetworkEvents:
+        # events the client has no handler for get a small payload
+        frames[name] = [event(name, payload) for payload in e.get(name, [pack("i", 1)])]
+    return frames
+
+def load(path):
+    """
+    Corpora from a capture file: ({event name: frames},
+    {battle command name: commands}) of the inbound frames
+    """
+    from capture import Capture, INBOUND
+    from protocol import EventNames, BattleCommandNames, PODecoder
+    events, commands = {}, {}
+    capture = Capture(path)
+    for timestamp, direction, data in capture:
+        if direction != INBOUND or not data:
+            continue
+        name = EventNames.get(ord(data[0]))
+        if name is None:
+            continue
+        events.setdefault(name, []).append(data)
+        if name in ('BattleMessage', 'SpectatingBattleMessage'):
+            d = PODecoder(data)
+            d.i = 5
+            payload = d.decode_bytes()
+            if payload and ord(payload[0]) < len(BattleCommandNames):
+                commands.setdefault(BattleCommandNames[ord(payload[0])], []).append(payload)
+    capture.close()
+    return events, commands
@@ -0,0 +1,208 @@
+# loadgen.py
+# How many bot sessions one process sustains against the mock server
+#
+# Usage: python benchmarks/loadgen.py [--clients N,N,...] [--seconds S]
+#                                     [--tick S] [--players N] [--rate R]
+#
+# For every N, N POClients log into one MockServer in memory and each one
+# joins a channel, spectates a battle, challenges a player and then chats
+# at --rate messages per second. The server's frames for the clients are
+# queued and handed over once per tick, so the latency from
+# sendChannelMessage to the echo of the message grows when the process
+# can't keep up. Memory is the resident size of the process, it doesn't
+# go down between rows: list N in increasing order.
+
+import os
+import gc
+import sys
+import time
+import random
+import argparse
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from framing import FramedProtocol
+from protocol import POClient, ChallengeInfo, ChallengeDesc
+from mockserver import MockServer
+
+class Null(object):
+    # swallows what login() prints
+    def write(self, data):
+        pass
+
+class Bot(FramedProtocol, POClient):
+
+    def __init__(self, name, server, rate, rng):
+        FramedProtocol.__init__(self)
+        self.name = name
+        self.rate = rate
+        self.rng = rng
+        self.battles = list(server.battles)
+        self.players = len(server.players)
+        self.inbox = []
+        self.connection = server.connect(self.inbox.append)
+        self.me = None
+        self.channel = None
+        self.due = rng.random()
+        self.seq = 0
+        self.pending = {}
+        self.latencies = []
+        self.refused = 0
+        self.battleMessages = 0
+
+    def native_send(self, data):
+        self.connection.dataReceived(data)
+
+    def receive(self):
+        """ Handles what the server sent since the last call """
+        # the connection appends to this very list
+        inbox = self.inbox[:]
+        del self.inbox[:]
+        for data in inbox:
+            self.dataReceived(data)
+
+    def tick(self, seconds):
+        if self.channel is None:
+            return
+        self.due += seconds * self.rate
+        while self.due >= 1:
+            self.due -= 1
+            self.seq += 1
+            self.pending[self.seq] = time.time()
+            self.sendChannelMessage(self.channel, u"ping %d" % self.seq)
+        self.connection.advance(seconds)
+
+    #### SCRIPT
+
+    def onLogin(self, player):
+        self.me = player.id
+        self.joinChannel(u"Bots")
+        if self.battles:
+            self.spectateBattle(self.rng.choice(self.battles))
+        if self.players:
+            self.challengeStuff(ChallengeInfo(ChallengeDesc['Sent'], self.rng.randint(1, self.players)))
+
+    def onJoinChannel(self, chanid, playerid):
+        if playerid == self.me:
+            self.channel = chanid
+
+    def onChannelMessage(self, chanid, user, message):
+        if user == self.name and message.startswith(u"ping "):
+            sent = self.pending.pop(int(message[5:]), None)
+            if sent is not None:
+                self.latencies.append(time.time() - sent)
+
+    def onChallengeStuff(self, challengeInfo):
+        self.refused += 1
+
+    def onSpectatingBattleMessage(self, battleid, message):
+        self.battleMessages += 1
+
+    def on_NotImplemented(self, ev, cmd):
+        pass
+
+def cpu():
+    if resource is None:
+        return time.clock()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def rss():
+    """ Resident size of the process in bytes, the peak one without /proc """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+def run(n, seconds, tick, players, rate, seed=0):
+    server = MockServer(players=players, channels=10, battles=max(1, players // 4), seed=seed,
+                        chatRate=2.0, battleRate=4.0)
+    rng = random.Random(seed)
+    memory = rss()
+    start = time.time()
+    bots = [Bot(u"bot%d" % k, server, rate, rng) for k in xrange(n)]
+    for bot in bots:
+        bot.login(bot.name)
+    for bot in bots:
+        bot.receive()
+    loginTime = time.time() - start
+
+    start, startCpu = time.time(), cpu()
+    late = ticks = 0
+    last = start
+    while last - start < seconds:
+        for bot in bots:
+            bot.tick(tick)
+        for bot in bots:
+            bot.receive()
+        ticks += 1
+        now = time.time()
+        if now - last > tick:
+            late += 1
+        else:
+            time.sleep(tick - (now - last))
+        last = time.time()
+    elapsed = time.time() - start
+    usedCpu = cpu() - startCpu
+
+    latencies = sorted(l for bot in bots for l in bot.latencies)
+    row = {
+        'clients': n,
+        'logged_in': sum(1 for bot in bots if bot.channel is not None),
+        'login_seconds': loginTime,
+        'messages': len(latencies),
+        'lost': sum(len(bot.pending) for bot in bots),
+        'battle_messages': sum(bot.battleMessages for bot in bots),
+        'challenges_refused': sum(bot.refused for bot in bots),
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'max': latencies[-1] if latencies else 0.0,
+        'cpu': usedCpu / elapsed,
+        'late_ticks': late / float(ticks),
+        'rss': rss(),
+        'rss_per_client': (rss() - memory) / float(n),
+    }
+    del bots, server
+    gc.collect()
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot sessions one process sustains against the mock server")
+    parser.add_argument("--clients", default="1,10,50,100,250", help="comma separated numbers of clients")
+    parser.add_argument("--seconds", type=float, default=5.0, help="seconds of chat for each number of clients")
+    parser.add_argument("--tick", type=float, default=0.05, help="seconds between two rounds of sending")
+    parser.add_argument("--players", type=int, default=200, help="players on the server besides the bots")
+    parser.add_argument("--rate", type=float, default=1.0, help="chat messages per second and client")
+    args = parser.parse_args()
+
+    print("%7s %8s %8s %8s %8s %8s %8s %6s %6s %9s %10s" % ("clients", "login s", "msgs", "p50 ms", "p90 ms",
+                                                           "p99 ms", "max ms", "cpu", "late", "rss MB", "KB/client"))
+    for n in [int(n) for n in args.clients.split(",")]:
+        stdout, sys.stdout = sys.stdout, Null()
+        try:
+            r = run(n, args.seconds, args.tick, args.players, args.rate)
+        finally:
+            sys.stdout = stdout
+        print("%7d %8.2f %8d %8.2f %8.2f %8.2f %8.2f %5.0f%% %5.0f%% %9.1f %10.1f" % (
+            r['clients'], r['login_seconds'], r['messages'], r['p50'] * 1000, r['p90'] * 1000,
+            r['p99'] * 1000, r['max'] * 1000, r['cpu'] * 100, r['late_ticks'] * 100,
+            r['rss'] / 1e6, r['rss_per_client'] / 1024))
+        if r['logged_in'] < n or r['lost']:
+            print("        %d of %d clients in a channel, %d messages without echo" % (r['logged_in'], n, r['lost']))
+
+if __name__ == "__main__":
+    main()
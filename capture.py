@@ -0,0 +1,118 @@
+# capture.py
+# Recording and replaying the frames of a Pokemon Online connection
+#
+# Licensed under BSD-style license.
+# See LICENSE for details
+
+"""
+A capture file starts with the magic "POCAP" and a version byte, then
+holds one record per frame:
+
+    timestamp : double - time.time() when the frame was seen
+    direction : uint8 - INBOUND or OUTBOUND
+    length : uint32 - length of the data
+    data : the frame without its length prefix
+
+Set POClient.recorder to a Recorder to capture a connection, every frame
+received and sent is appended. replay() maps a capture into memory and
+feeds the inbound frames to a client, as fast as possible or at the
+pace they were recorded.
+"""
+
+import io
+import mmap
+import time
+import struct
+
+MAGIC = "POCAP"
+VERSION = 1
+
+INBOUND = 0
+OUTBOUND = 1
+
+_header = struct.Struct("!5sB")
+_record = struct.Struct("!dBI")
+
+class Recorder(object):
+
+    def __init__(self, path):
+        self.file = io.open(path, "wb")
+        self.file.write(_header.pack(MAGIC, VERSION))
+        self.frames = 0
+
+    def inbound(self, data):
+        """ Records a frame received, data without the length prefix """
+        self.file.write(_record.pack(time.time(), INBOUND, len(data)))
+        self.file.write(data)
+        self.frames += 1
+
+    def outbound(self, frame):
+        """ Records a frame sent, frame with the length prefix """
+        self.file.write(_record.pack(time.time(), OUTBOUND, len(frame) - 4))
+        self.file.write(memoryview(frame)[4:])
+        self.frames += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class Capture(object):
+    """ A capture file mapped into memory """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = _header.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a capture file of version %d" % (path, VERSION))
+
+    def __iter__(self):
+        """ Yields (timestamp, direction, data) for every record """
+        m = self.map
+        i = _header.size
+        end = len(m)
+        unpack_from = _record.unpack_from
+        size = _record.size
+        while i + size <= end:
+            timestamp, direction, length = unpack_from(m, i)
+            i += size
+            if i + length > end:
+                # the recorder was stopped in the middle of a write
+                break
+            yield timestamp, direction, m[i:i+length]
+            i += length
+
+    def close(self):
+        self.map.close()
+
+def replay(client, path, paced=False, speed=1.0):
+    """
+    Feeds the inbound frames of the capture at path to client.stringReceived.
+    paced : bool - wait between frames as long as they were apart when
+        recorded, divided by speed; otherwise go as fast as possible
+    Returns (frames, bytes, seconds) replayed.
+    The outbound frames are skipped, the client should still have a
+    native_send for the handlers that answer the server.
+    """
+    capture = Capture(path)
+    frames = total = 0
+    start = time.time()
+    first = None
+    try:
+        for timestamp, direction, data in capture:
+            if direction != INBOUND:
+                continue
+            if paced:
+                if first is None:
+                    first = timestamp
+                delay = (timestamp - first) / speed - (time.time() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            client.stringReceived(data)
+            frames += 1
+            total += len(data)
+    finally:
+        capture.close()
+    return frames, total, time.time() - start
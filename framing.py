@@ -0,0 +1,122 @@
+# framing.py
+# Transport independent framing of Pokemon Online protocol
+#
+# Licensed under BSD-style license.
+# See LICENSE for details
+
+"""
+Every Pokemon Online message travels as a frame: the length of the data
+as a big endian uint32 followed by the data itself.
+"""
+
+import struct
+
+_length = struct.Struct("!I")
+
+class FrameDecoder(object):
+    """
+    Incremental frame parser. Feed it the chunks read from the transport,
+    it yields the data of every frame completed by them.
+
+    Incoming data is appended to one buffer and frames are read from it
+    at an offset, the consumed part is only cut off now and then.
+    """
+
+    # cut the consumed data off the buffer once this much of it is there
+    compactThreshold = 65536
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offset = 0
+        self.feeding = False
+
+    def feed(self, data):
+        buf = self.buffer
+        buf += data
+        if self.feeding:
+            # called from the handler of a frame yielded below: the data
+            # is only queued, the outer loop yields its frames in order
+            return
+        self.feeding = True
+        try:
+            while len(buf) - self.offset >= 4:
+                length, = _length.unpack_from(buf, self.offset)
+                start = self.offset + 4
+                if len(buf) - start < length:
+                    break
+                self.offset = start + length
+                yield str(buffer(buf, start, length))
+            if self.offset == len(buf):
+                del buf[:]
+                self.offset = 0
+            elif self.offset >= self.compactThreshold:
+                del buf[:self.offset]
+                self.offset = 0
+        finally:
+            self.feeding = False
+
+    def pending(self):
+        """ Number of bytes received but not yet returned as frames """
+        return len(self.buffer) - self.offset
+
+class FrameEncoder(object):
+    """
+    Frames outgoing data into a buffer which is reused between writes.
+    take() returns everything written since the last take().
+    """
+
+    def __init__(self, capacity=4096):
+        self.buffer = bytearray(capacity)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def reserve(self, n):
+        end = self.size + n
+        if end > len(self.buffer):
+            self.buffer.extend("\0" * max(end - len(self.buffer), len(self.buffer)))
+        return end
+
+    def write(self, data):
+        """ Appends data as one frame """
+        end = self.reserve(4 + len(data))
+        _length.pack_into(self.buffer, self.size, len(data))
+        self.buffer[self.size+4:end] = data
+        self.size = end
+
+    def writeFrame(self, frame):
+        """ Appends data already framed, length prefix included """
+        end = self.reserve(len(frame))
+        self.buffer[self.size:end] = frame
+        self.size = end
+
+    def take(self):
+        """ One copy of everything written, meant for batches of frames """
+        data = memoryview(self.buffer)[:self.size].tobytes()
+        self.size = 0
+        return data
+
+class FramedProtocol(object):
+    """
+    Mixin doing the framing of POClient or PORegistryClient itself, so they
+    can be run on any transport without Twisted:
+
+        class Client(FramedProtocol, POClient):
+            def native_send(self, data):
+                sock.sendall(data)
+
+    and call client.dataReceived(data) with whatever the transport reads.
+    """
+
+    def __init__(self):
+        self.frameDecoder = FrameDecoder()
+
+    def dataReceived(self, data):
+        for frame in self.frameDecoder.feed(data):
+            self.stringReceived(frame)
+
+    def send(self, data):
+        # the frame goes through sendFrame, POClient may queue it, so it
+        # can't be a view of a reused buffer: build it with one copy
+        self.sendFrame(_length.pack(len(data)) + data)
@@ -2,5 +2,10 @@ __all__=[]
 try:
     from twisted_interface import *
     __all__.extend(["TwistedRegistryProtocol", "TwistedClientProtocol"])
-except:
+except ImportError:
+    pass
+try:
+    from asyncio_interface import *
+    __all__.extend(["AsyncioRegistryProtocol", "AsyncioClientProtocol"])
+except ImportError:
     pass
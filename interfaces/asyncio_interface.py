@@ -0,0 +1,108 @@
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+from poprotocol import PORegistryClient, POClient
+from poprotocol.framing import FramedProtocol
+
+class AsyncioRegistryProtocol(FramedProtocol, PORegistryClient, asyncio.Protocol):
+    def __init__(self):
+        FramedProtocol.__init__(self)
+        PORegistryClient.__init__(self)
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.dataReceived(data)
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+class AsyncioClientProtocol(FramedProtocol, POClient, asyncio.Protocol):
+    """
+    POClient over an asyncio transport. In coalescing mode the frames
+    queued are handed to transport.writelines together at flush().
+    """
+
+    def __init__(self, loop=None):
+        """
+        loop : the event loop of the connection, the running one when
+            the connection is made by default
+        """
+        FramedProtocol.__init__(self)
+        POClient.__init__(self)
+        self.transport = None
+        self.loop = loop
+        self.flushHandle = None
+        self.frames = []
+        self.queued = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.loop is None:
+            # called by the loop running the transport
+            self.loop = asyncio.get_event_loop()
+
+    def data_received(self, data):
+        self.dataReceived(data)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        if self.flushHandle is not None:
+            self.flushHandle.cancel()
+            self.flushHandle = None
+        # the frames queued are lost with the connection
+        self.frames = []
+        self.queued = 0
+
+    def native_send(self, data):
+        self.transport.write(data)
+
+    def sendFrame(self, frame):
+        if not self.coalesce:
+            POClient.sendFrame(self, frame)
+            return
+        if self.recorder is not None:
+            self.recorder.outbound(frame)
+        # the frames are not copied into one buffer, the transport
+        # takes the whole list at once
+        first = not self.frames
+        self.frames.append(frame)
+        self.queued += len(frame)
+        if self.queued >= self.coalesceMaxBytes:
+            self.flush()
+        elif first:
+            self.scheduleFlush(self.coalesceMaxDelay)
+
+    def flush(self):
+        self.flushHandle = None
+        if self.transport is not None and self.frames:
+            frames, self.frames = self.frames, []
+            self.queued = 0
+            self.transport.writelines(frames)
+
+    def scheduleFlush(self, delay):
+        if delay:
+            self.flushHandle = self.loop.call_later(delay, self.flush)
+        else:
+            self.flushHandle = self.loop.call_soon(self.flush)
+
+def connect(protocol_factory, host, port, loop=None):
+    """
+    Connects one protocol_factory() instance to the server,
+    returns a coroutine giving (transport, protocol)
+    """
+    loop = loop or asyncio.get_event_loop()
+    return loop.create_connection(protocol_factory, host, port)
+
+def connect_many(protocol_factory, host, port, count, loop=None):
+    """
+    Connects count protocol_factory() instances to the server on the same
+    event loop, returns a future of the list of (transport, protocol)
+    """
+    loop = loop or asyncio.get_event_loop()
+    # tasks of loop, gather follows the loop of what it is given
+    return asyncio.gather(*[loop.create_task(connect(protocol_factory, host, port, loop)) for k in xrange(count)])
@@ -11,4 +11,10 @@ class TwistedClientProtocol(POClient, Int32StringReceiver):
         POClient.__init__(self)
 
     def native_send(self, data):
-        self.transport.write(data)
+        # twisted joins its write buffer as str, frames built by POWriter are bytearrays
+        self.transport.write(bytes(data))
+
+    def scheduleFlush(self, delay):
+        # imported here, importing the reactor installs the default one
+        from twisted.internet import reactor
+        reactor.callLater(delay, self.flush)
@@ -0,0 +1,340 @@
+# mockserver.py
+# A stand-in Pokemon Online server for testing clients
+#
+# Licensed under BSD-style license.
+# See LICENSE for details
+
+"""
+MockServer answers the login of a client the way a Pokemon Online server
+does: VersionControl, Login, PlayersList, ChannelsList, the players of
+the default channel and its BattleList. Afterwards advance() makes up
+chat in the default channel and battle commands for the battles the
+client spectates, at chatRate and battleRate per second.
+
+The server does no IO, connect() wires a FramedProtocol client to it
+in memory:
+
+    server = MockServer(players=5000)
+    connection = connect(server, client)
+    client.login(u"bot")
+    connection.advance(0.5)
+"""
+
+import zlib
+import random
+
+from protocol import PODecoder, POWriter, NetworkEvents, BattleCommands, EventNames, ChallengeDesc, Color
+from framing import FrameDecoder
+
+CHAT = [
+    u"anyone up for a battle?",
+    u"gg",
+    u"what tier is that in",
+    u"that crit though",
+    u"brb",
+    u"looking for OU battles",
+    u"how do I change my team?",
+    u"lol",
+]
+
+class MockPlayer(object):
+    __slots__ = ('id', 'name', 'info', 'auth', 'away', 'avatar', 'color', 'tiers')
+
+    def __init__(self, playerid, name):
+        self.id = playerid
+        self.name = name
+        self.info = u"Trainer %s" % name
+        self.auth = 0
+        self.away = False
+        self.avatar = playerid % 300
+        self.color = Color(1, 255, playerid % 256, 128, 64, 0)
+        self.tiers = [(u"OU", 1000 + playerid % 500)]
+
+class ServerWriter(POWriter):
+    """ POWriter for what the server sends """
+
+    def begin_version(self, version=0):
+        """ Starts a version_controlled struct, returns its offset for end_version """
+        start = self.i
+        self.write_struct("HB", 0, version)
+        return start
+
+    def end_version(self, start):
+        self.buffer[start:start+2] = bytearray(2)
+        self.i, end = start, self.i
+        self.write_number("H", end - start - 2)
+        self.i = end
+
+    def write_PlayerInfo(self, player):
+        start = self.begin_version()
+        self.write_number("i", player.id)
+        self.write_struct("BB", 0, (1 if player.away else 0) | 2)
+        self.write_string(player.name)
+        self.write_Color(player.color)
+        self.write_number("H", player.avatar)
+        self.write_string(player.info)
+        self.write_struct("bB", player.auth, len(player.tiers))
+        for tier, rating in player.tiers:
+            self.write_string(tier)
+            self.write_number("h", rating)
+        self.end_version(start)
+
+    def write_BattleConfiguration(self, players, rated=True):
+        self.write_struct("BBBBI", 0, 1 if rated else 0, 5, 0, 0)
+        self.write_struct("ii", *players)
+
+class MockServer(object):
+
+    def __init__(self, players=1000, channels=10, battles=100, seed=0,
+                 chatRate=10.0, battleRate=2.0, playersPerFrame=256, compress=False):
+        """
+        players, channels, battles : int - size of the world at login
+        chatRate : float - chat messages per second in the default channel
+        battleRate : float - battle commands per second per spectated battle
+        playersPerFrame : int - players in each PlayersList frame
+        compress : bool - send the login burst as ZipCommand to clients supporting it
+        """
+        self.random = random.Random(seed)
+        self.players = [MockPlayer(k, u"player%d" % k) for k in xrange(1, players+1)]
+        self.channels = [u"Pokemon Online"] + [u"Channel %d" % k for k in xrange(1, channels)]
+        self.battles = {}
+        for battleid in xrange(1, battles+1):
+            self.battles[battleid] = tuple(self.random.sample(xrange(1, players+1), 2)) if players > 1 else (1, 1)
+        self.chatRate = chatRate
+        self.battleRate = battleRate
+        self.playersPerFrame = playersPerFrame
+        self.compress = compress
+        self.nextId = players + 1
+
+    def newPlayer(self, name):
+        player = MockPlayer(self.nextId, name)
+        self.nextId += 1
+        return player
+
+    def connect(self, send):
+        """ A new client, send(data) is called with the data for it """
+        return MockConnection(self, send)
+
+class MockConnection(object):
+    """ The server side of one client """
+
+    # battle commands the spectators get, in a loop
+    script = [
+        ('BeginTurn', "i"),
+        ('UseAttack', "H"),
+        ('Effective', "B"),
+        ('ChangeHp', "H"),
+        ('StatChange', "bb"),
+        ('UseAttack', "H"),
+        ('ChangeHp', "H"),
+    ]
+
+    def __init__(self, server, send):
+        self.server = server
+        self.send = send
+        self.frames = FrameDecoder()
+        self.player = None
+        self.zip = False
+        self.channels = set()
+        self.spectating = {}
+        self.chatDue = 0.0
+        self.battleDue = 0.0
+        self.chatLine = 0
+
+    def frame(self, event, capacity=256):
+        w = ServerWriter(capacity, framed=True)
+        w.write_number("B", NetworkEvents[event])
+        return w
+
+    def dataReceived(self, data):
+        for frame in self.frames.feed(data):
+            cmd = PODecoder(frame)
+            handler = getattr(self, "on_%s" % EventNames.get(cmd.decode_number("B")), None)
+            if handler is not None:
+                handler(cmd)
+
+    #### LOGIN
+
+    def on_Login(self, cmd):
+        cmd.decode_ProtocolVersion()
+        network_flags = cmd.decode_number("B")
+        if network_flags & 1:
+            cmd.decode_string()
+        if network_flags & 2:
+            cmd.decode_number("H")
+        name = cmd.decode_string()
+        data_flags = cmd.decode_number("B")
+        self.zip = self.server.compress and data_flags & 1 > 0
+        self.player = self.server.newPlayer(name)
+        server = self.server
+
+        # current version, zip support, latest, compatibility and major
+        # compatibility versions: the clients of this library never complain
+        w = self.frame('VersionControl')
+        w.write_ProtocolVersion(2, 0)
+        w.write_number("B", 1)
+        w.write_ProtocolVersion(2, 0)
+        w.write_ProtocolVersion(0, 0)
+        w.write_ProtocolVersion(0, 0)
+        w.write_string(u"Mock Server")
+        self.send(w.getvalue())
+
+        w = self.frame('Login')
+        w.write_number("B", 0)
+        w.write_PlayerInfo(self.player)
+        w.write_number("I", 1)
+        w.write_string(u"OU")
+        self.send(w.getvalue())
+
+        burst = []
+        players = server.players + [self.player]
+        for k in xrange(0, len(players), server.playersPerFrame):
+            w = self.frame('PlayersList', 64 * server.playersPerFrame)
+            for player in players[k:k+server.playersPerFrame]:
+                w.write_PlayerInfo(player)
+            burst.append(w.getvalue())
+        w = self.frame('ChannelsList')
+        w.write_number("I", len(server.channels))
+        for chanid, name in enumerate(server.channels):
+            w.write_number("i", chanid)
+            w.write_string(name)
+        burst.append(w.getvalue())
+        burst.extend(self.joined(0))
+        w = self.frame('BattleList', 16 + 12 * len(server.battles))
+        w.write_struct("iI", 0, len(server.battles))
+        for battleid, (player1, player2) in server.battles.iteritems():
+            w.write_struct("iii", battleid, player1, player2)
+        burst.append(w.getvalue())
+        if self.zip:
+            # type 1: length prefixed frames, inflated size up front
+            data = "".join(str(frame) for frame in burst)
+            compressed = zlib.compress(data)
+            w = self.frame('ZipCommand', 16 + len(compressed))
+            w.write_struct("BI", 1, len(data))
+            end = w.reserve(len(compressed))
+            w.buffer[w.i:end] = compressed
+            w.i = end
+            burst = [w.getvalue()]
+        for frame in burst:
+            self.send(frame)
+
+    def joined(self, chanid):
+        """ Frames telling the client it joined chanid """
+        self.channels.add(chanid)
+        w = self.frame('JoinChannel')
+        w.write_struct("ii", chanid, self.player.id)
+        ids = [player.id for player in self.server.players] + [self.player.id]
+        members = self.frame('ChannelPlayers', 16 + 4 * len(ids))
+        members.write_struct("iI", chanid, len(ids))
+        members.write_struct("%di" % len(ids), *ids)
+        return [w.getvalue(), members.getvalue()]
+
+    #### COMMANDS OF THE CLIENT
+
+    def on_JoinChannel(self, cmd):
+        name = cmd.decode_string()
+        channels = self.server.channels
+        if name not in channels:
+            channels.append(name)
+            w = self.frame('AddChannel')
+            w.write_string(name)
+            w.write_number("i", len(channels) - 1)
+            self.send(w.getvalue())
+        for frame in self.joined(channels.index(name)):
+            self.send(frame)
+
+    def on_LeaveChannel(self, cmd):
+        chanid = cmd.decode_number("i")
+        self.channels.discard(chanid)
+        w = self.frame('LeaveChannel')
+        w.write_struct("ii", chanid, self.player.id)
+        self.send(w.getvalue())
+
+    def on_ChannelMessage(self, cmd):
+        # echoed like the server relays it to everyone in the channel
+        chanid = cmd.decode_number("i")
+        message = cmd.decode_string()
+        w = self.frame('ChannelMessage')
+        w.write_number("i", chanid)
+        w.write_string(u"%s: %s" % (self.player.name, message))
+        self.send(w.getvalue())
+
+    def on_SpectateBattle(self, cmd):
+        battleid = cmd.decode_number("i")
+        players = self.server.battles.get(battleid)
+        if players is None:
+            return
+        self.spectating[battleid] = 0
+        w = self.frame('SpectateBattle')
+        w.write_number("i", battleid)
+        w.write_BattleConfiguration(players)
+        self.send(w.getvalue())
+
+    def on_ChallengeStuff(self, cmd):
+        # the made up players turn every challenge down
+        dsc, opp, clauses, mode = cmd.decode_struct("biIB")
+        if dsc != ChallengeDesc['Sent']:
+            return
+        w = self.frame('ChallengeStuff')
+        w.write_struct("biIBBB", ChallengeDesc['Refused'], opp, clauses, mode, 0, 5)
+        w.write_string(u"OU")
+        w.write_string(u"OU")
+        self.send(w.getvalue())
+
+    def on_SpectatingBattleFinished(self, cmd):
+        self.spectating.pop(cmd.decode_number("i"), None)
+
+    #### TRAFFIC
+
+    def advance(self, seconds):
+        """
+        Sends the chat and battle messages due in seconds,
+        returns the number of frames sent
+        """
+        if self.player is None:
+            return 0
+        sent = 0
+        server = self.server
+        self.chatDue += seconds * server.chatRate
+        while self.chatDue >= 1 and self.channels:
+            self.chatDue -= 1
+            speaker = server.players[self.chatLine % len(server.players)] if server.players else self.player
+            w = self.frame('ChannelMessage')
+            w.write_number("i", 0 if 0 in self.channels else min(self.channels))
+            w.write_string(u"%s: %s" % (speaker.name, CHAT[self.chatLine % len(CHAT)]))
+            self.chatLine += 1
+            self.send(w.getvalue())
+            sent += 1
+        self.battleDue += seconds * server.battleRate
+        while self.battleDue >= 1:
+            self.battleDue -= 1
+            for battleid, step in self.spectating.items():
+                self.send(self.battleMessage(battleid, step))
+                self.spectating[battleid] = step + 1
+                sent += 1
+        return sent
+
+    def battleMessage(self, battleid, step):
+        name, fmt = self.script[step % len(self.script)]
+        values = {
+            'BeginTurn': (step // len(self.script) + 1,),
+            'UseAttack': (85 + step % 7,),
+            'Effective': (4,),
+            'ChangeHp': (100 - step % 100,),
+            'StatChange': (1 + step % 7, 1),
+        }[name]
+        command = ServerWriter(16)
+        command.write_struct("BB" + fmt, BattleCommands[name], step % 2, *values)
+        w = self.frame('SpectatingBattleMessage')
+        w.write_number("i", battleid)
+        w.write_bytes(command.getvalue())
+        return w.getvalue()
+
+def connect(server, client):
+    """
+    Connects the FramedProtocol client to server in memory,
+    returns the MockConnection
+    """
+    connection = server.connect(client.dataReceived)
+    client.native_send = connection.dataReceived
+    return connection
@@ -5,12 +5,82 @@
 # Licensed under BSD-style license.
 # See LICENSE for details
 
+import sys
 import time
+import array
 import socket
 import struct
+import zlib
 import codecs
 import functools
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from schema import Schema, Field, String, Flags, Nested, List, If, Let
+from framing import FrameDecoder, FrameEncoder
+
+_structs = {}
+
+def get_struct(fmt):
+    """
+    Returns the precompiled struct.Struct for fmt.
+    Formats are always read in network byte order, so "H" and "!H" share one entry.
+    """
+    try:
+        return _structs[fmt]
+    except KeyError:
+        s = struct.Struct(fmt if fmt[0] == "!" else "!%s" % fmt)
+        _structs[fmt] = _structs[s.format] = s
+        return s
+
+for _fmt in ("b", "B", "h", "H", "i", "I"):
+    get_struct(_fmt)
+
+# array.array typecodes with the same size as the struct formats
+_arraycodes = {}
+for _fmt, _codes in (("b", "b"), ("B", "B"), ("h", "h"), ("H", "H"), ("i", "il"), ("I", "IL")):
+    _arraycodes[_fmt] = [c for c in _codes if array.array(c).itemsize == struct.calcsize(_fmt)][0]
+
+# decompressobj has eof since python 3.3. Before that a sentinel byte is
+# fed once the compressed data is consumed: it ends up in unused_data
+# only when the stream, adler32 trailer included, ended before it
+_zlibHasEof = hasattr(zlib.decompressobj(), "eof")
+
+def stream_ended(inflater):
+    """ Tells whether the zlib stream of inflater reached its end """
+    if _zlibHasEof:
+        return inflater.eof
+    return len(inflater.unused_data) > 0
+
+def inflate(inflater, data, limit, chunkSize):
+    """
+    Yields the data inflated from the zlib stream in data, chunkSize
+    bytes at most at a time. Stops at the end of the stream, when data
+    runs out, or once more than limit bytes were yielded.
+    Check stream_ended(inflater) afterwards to tell a truncated stream.
+    """
+    sentinel = not _zlibHasEof
+    inflated = 0
+    while inflated <= limit and not stream_ended(inflater):
+        if not data:
+            if not sentinel:
+                chunk = inflater.flush()
+                if chunk:
+                    yield chunk
+                return
+            data = "\0"
+            sentinel = False
+        # past the end of the stream python 2 keeps the rest of data in
+        # unconsumed_tail too, only stream_ended tells it is done
+        chunk = inflater.decompress(data, min(chunkSize, limit - inflated + 1))
+        data = inflater.unconsumed_tail
+        inflated += len(chunk)
+        if chunk:
+            yield chunk
+
 def version_controlled(version):
     """
     Wraps a function for version control:
@@ -23,7 +93,7 @@ def version_controlled(version):
             j = self.i
             structure_version = self.decode_number("B")
             if version != structure_version:
-                print("Warning: we have a different version ({}) of {} ({}) than server".format(version, func.__name__, strcture_version))
+                print("Warning: we have a different version ({}) of {} ({}) than server".format(version, func.__name__, structure_version))
             res = func(self, *args)
             self.i = j+structure_length
             return res
@@ -32,33 +102,91 @@ def version_controlled(version):
 
 class PODecoder(object):
 
-    def __init__(self, cmd):
+    def __init__(self, cmd, skip=()):
+        """
+        cmd : bytes - the data to decode
+        skip : iterable - names of structs (e.g. "PlayerInfo") to skip:
+            their decode_ methods move past them and return None
+        """
         self.codec = codecs.lookup("utf_8")
         self.i = 0
         self.cmd = cmd
+        self.skip = skip
+        for name in skip:
+            setattr(self, "decode_%s" % name, getattr(self, "skip_%s" % name))
 
     #### DECODING METHODS
 
     def decode_number(self, fmt):
         # See http://docs.python.org/library/struct.html#format-characters
         # for explanations of fmt
-        if fmt[0] != "!":
-            fmt = "!%s" % fmt
-        l = struct.calcsize(fmt)
-        if len(self.cmd) >= self.i+l:
-            n = struct.unpack(fmt, self.cmd[self.i:self.i+l])[0]
+        s = _structs.get(fmt) or get_struct(fmt)
+        if len(self.cmd) >= self.i+s.size:
+            n = s.unpack_from(self.cmd, self.i)[0]
         else:
             n = 0
-        self.i+=l
+        self.i += s.size
         return n
 
-    def decode_flags(cmd):
+    def decode_struct(self, fmt):
+        """
+        Decodes several fixed width fields with one unpack, returns a tuple.
+        Like decode_number, missing data decodes as zeros.
+        """
+        s = _structs.get(fmt) or get_struct(fmt)
+        if len(self.cmd) >= self.i+s.size:
+            t = s.unpack_from(self.cmd, self.i)
+        else:
+            t = s.unpack("\0" * s.size)
+        self.i += s.size
+        return t
+
+    def decode_numbers(self, fmt, count, asarray=False):
+        """
+        Decodes count numbers of the same fmt in one step, as a list.
+        With asarray the numbers are returned as a numpy array of
+        big endian dtype when numpy is available, else as an array.array.
+        count comes from the wire: no more numbers are returned than
+        the rest of the command holds.
+        """
+        size = get_struct(fmt).size
+        cmd, i = self.cmd, self.i
+        count = max(0, min(count, (len(cmd) - i + size - 1) // size))
+        # a trailing partial number is missing data and decodes as zero
+        # like in decode_number, it is not padded into a value
+        whole = max(0, min(count, (len(cmd) - i) // size))
+        missing = count - whole
+        self.i += size*count
+        if not asarray:
+            numbers = list(struct.unpack_from("!%d%s" % (whole, fmt), cmd, i))
+            return numbers + [0] * missing
+        if numpy is not None:
+            dtype = ">%s%d" % ("i" if fmt in "bhi" else "u", size)
+            a = numpy.frombuffer(cmd, dtype=dtype, count=whole, offset=i)
+            if missing:
+                a = numpy.concatenate((a, numpy.zeros(missing, dtype=dtype)))
+            return a
+        data = cmd[i:i+size*whole]
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        a = array.array(_arraycodes[fmt])
+        a.fromstring(data)
+        if size > 1 and sys.byteorder == "little":
+            a.byteswap()
+        a.extend([0] * missing)
+        return a
+
+    def decode_flags(self):
+        # Bit 7 of every byte marks that another byte follows.
+        # POEncoder.login only sends flags below 128, as a single "B"
         flags = 0
+        shift = 0
         while True:
             b = self.decode_number("B")
-            flags = (flags << 8) + b
-            if b % 128 == 0:
+            flags |= b << shift
+            if not b & 128:
                  break
+            shift += 8
         return flags
 
     def decode_bool(self):
@@ -74,240 +202,205 @@ class PODecoder(object):
             self.i += l
         return b
 
+    def skip_bytes(self):
+        l = self.decode_number("I")
+        if l != 0xFFFFFFFF:
+            self.i += l
+
+    skip_string = skip_bytes
+
     def decode_string(self):
         l = self.decode_number("I")
         if l == 0xFFFFFFFF:
             s = ""
         else:
-            s = self.cmd[self.i:self.i+l]
-            s = self.codec.decode(s)[0]
+            s = self.codec.decode(self.cmd[self.i:self.i+l])[0]
             self.i += l
         return s
 
     def decode_ProtocolVersion(self):
-        version = self.decode_number("H")
-        subversion = self.decode_number("H")
-        return (version,subversion)
-
-    def decode_color(self):
-        color = Color()
-        color.color_spec = self.decode_number("b")
-        color.alpha = self.decode_number("H")
-        color.red = self.decode_number("H")
-        color.green = self.decode_number("H")
-        color.blue = self.decode_number("H")
-        color.pad = self.decode_number("H")
-        return color
-
-    def decode_pokeid(self):
-        uid = pokeid()
-        uid.pokenum = self.decode_number("H")
-        uid.subnum = self.decode_number("B")
-        return uid
+        return self.decode_struct("HH")
+
+    # decode_PlayerInfo, decode_PokePersonal and the other struct decoders
+    # are generated from the wire schemas at the end of this module
 
     @version_controlled(0)
-    def decode_PlayerInfo(self, cmd, i):
-        player = PlayerInfo()
+    def decode_LazyPlayerInfo(self):
+        """
+        Decodes the id, flags, name, avatar and auth of a PlayerInfo and skips
+        the rest, see LazyPlayerInfo
+        """
+        player = LazyPlayerInfo(self.cmd, self.i - 3, self.skip)
         player.id = self.decode_number("i")
-        # network flags: none
-        network_flags = self.decode_flags()
-        # data flags: away, hasLadder
+        self.decode_flags()
         data_flags = self.decode_flags()
         player.away = data_flags & 1 > 0
         player.hasLadder = data_flags & 2 > 0
         player.name = self.decode_string()
-        player.color = self.decode_color()
+        player._colorOffset = self.i
+        self.i += ColorSchema.size
         player.avatar = self.decode_number("H")
-        player.info = self.decode_string()
+        self.skip_string()
         player.auth = self.decode_number("b")
-        teamcount = self.decode_number("B")
-        player.teams = []
-        for k in range(teamcount):
-            tier = self.decode_string()
-            rating = self.decode_number("h")
-            player.teams.append({'tier': tier, 'rating': rating})
         return player
 
-    @version_controlled(0)
-    def decode_TrainerInfo(self):
-        trainerinfo = TrainerInfo()
-        network_flags = self.decode_flags()
-        hasBattleMessage = network_flags & 1 > 0
-        trainerinfo.avatar = self.decode_number("H")
-        trainerinfo.info = self.decode_string()
-        if hasBattleMessages:
-            trainerinfo.lose = self.decode_string()
-            trainerinfo.win = self.decode_string()
-            trainerinfo.tie = self.decode_string()
-        return trainerinfo
+    def decode_List(self, decode_fun):
+        num = self.decode_number("I")
+        a = []
+        for j in range(num):
+            item = decode_fun()
+            a.append(item)
+        return a
+     
+class POWriter(object):
+    """
+    Encodes into one bytearray with Struct.pack_into, growing it as needed.
+    A framed writer reserves the 4 byte length prefix up front and
+    getvalue() fills it in.
+    """
 
-    @version_controlled(0)
-    def decode_Team(self, cmd, i):
-        team = Team()
-        network_flags = self.decode_flags()
-        hasDefaultTier = flags & 1  > 0
-        hasNumberOfPokemon = flags & 2 > 0
-        if hasDefaultTier:
-            team.defaultTier = self.decode_string()
-        team.gen = self.decode_gen()
-        pokes = self.decode_number("B") if hasNumberOfPokemon else 6
-        for k in xrange(pokes):
-            team.poke[k] = self.decode_PokePersonal(team.gen)
-        return team
+    def __init__(self, capacity=256, framed=False):
+        self.codec = codecs.lookup("utf_8")
+        self.buffer = bytearray(capacity)
+        self.framed = framed
+        self.i = 4 if framed else 0
 
-    @version_controlled(0)
-    def decode_PokePersonal(self, gen=5):
-        poke = PokePersonal()
-        network_flags = self.decode_flags()
-        hasGen = network_flags & 1 > 0
-        hasNickname > network_flags & 2 > 0
-        hasPokeball > network_flags & 4 > 0
-        hasHappiness > network_flags & 8 > 0
-        hasPPups > network_flags & 16 > 0
-        hasIVs > network_flags & 32 > 0
-        poke.gen = self.decode_gen() if hasGen else gen
-        poke.pokeid = self.decode_pokeid()
-        poke.level= self.decode_number("B")
-        data_flags = self.decode_flags()
-        poke.isShiny = data_flags & 1 > 0
-        if hasNickname:
-            poke.nickname = self.decode_string()
-        if hasPokeball:
-            poke.ball = self.decode_number("H")
-        if poke.gen >= 2:
-            poke.item = self.decode_number("H")
-            if poke.gen >= 3:
-                poke.ability = self.decode_number("H")
-                poke.nature = self.decode_number("B")
-            poke.gender = self.decode_number("B")
-            if hasHappiness:
-                poke.happiness = self.decode_number("B")
-        if hasPPups:
-            poke.ppups = self.decode_number("B")
-        for k in xrange(4):
-            poke.move[k], i = self.decode_number(cmd, i, "!I")
-        for k in xrange(6):
-            poke.dv[k] = self.decode_number("B")
-        for k in xrange(6):
-            poke.ev[k] = self.decode_number("B") if hasIVs else 31
-        return poke
-
-    def decode_ChallengeInfo(self):
-        c = ChallengeInfo()
-        c.description = self.decode_number("b")
-        c.playerId = self.decode_number("i")
-        c.clauses = self.decode_number("I")
-        c.mode = self.decode_number("B")
-        c.team = self.decode_number("B")
-        c.gen = self.decode_gen()
-        c.srctier = self.decode_string()
-        c.desttier = self.decode_string()
-        return c
-
-    def decode_BattleConfiguration(self):
-        bc = BattleConfiguration()
-        network_flags = self.decode_flags()
-        hasNumberOfIds = network_flags & 1 > 0
-        data_flags = self.decode_flags()
-        bc.isRated = data_flags & 1 > 0
-        bc.gen = self.decode_gen()
-        bc.mode = self.decode_number("B")
-        bc.clauses = self.decode_number("I")
-        numberOfIds = self.decode_number("B") if hasNumberOfIds else 2
-        bc.id=[]
-        for k in range(numberOfIds):
-            bc.id.append(self.decode_number("i"))
-        return bc
-
-    def decode_TeamBattle(self):
-        tb = TeamBattle()
-        for k in xrange(6):
-            tb.m_pokemons[k] = self.decode_PokeBattle()
-        return tb
+    def reserve(self, n):
+        end = self.i + n
+        if end > len(self.buffer):
+            self.buffer.extend("\0" * max(end - len(self.buffer), len(self.buffer)))
+        return end
 
-    @version_controlled(0)
-    def decode_PokeBattle(self):
-        pb = PokeBattle()
-        pb.num = self.decode_pokeid()
-        data_flags = self.decode_flags()
-        pb.isShiny = data_flags & 1 > 0
-        pb.nick = self.decode_string()
-        pb.totalLifePoints = self.decode_number("H")
-        pb.lifePoints = self.decode_number("H")
-        pb.gender = self.decode_number("B")
-        pb.level = self.decode_number("B")
-        pb.item = self.decode_number("H")
-        pb.ability = self.decode_number("H")
-        pb.happiness = self.decode_number("B")
-        for k in xrange(5):
-            pb.normal_stats[k] = self.decode_number("H")
-        for k in xrange(4):
-            pb.move[k] = self.decode_BattleMove()
-        for k in xrange(6):
-            pb.evs[k] = self.decode_number("B")
-        for k in xrange(6):
-            pb.dvs[k] = self.decode_number("B")
-        return pb
+    def getvalue(self):
+        """
+        Returns the encoded data, the buffer itself cut to size.
+        Nothing may be written after this.
+        """
+        if self.framed:
+            _structs["I"].pack_into(self.buffer, 0, self.i - 4)
+        del self.buffer[self.i:]
+        return self.buffer
 
-    # STILL IN OLD FORMAT
-    def decode_ShallowShownTeam(self, cmd, i):
-        t = ShallowShownTeam()
+    #### ENCODING METHODS
+
+    def write_number(self, fmt, n):
+        s = _structs.get(fmt) or get_struct(fmt)
+        end = self.reserve(s.size)
+        s.pack_into(self.buffer, self.i, n)
+        self.i = end
+
+    def write_struct(self, fmt, *values):
+        s = _structs.get(fmt) or get_struct(fmt)
+        end = self.reserve(s.size)
+        s.pack_into(self.buffer, self.i, *values)
+        self.i = end
+
+    def write_bytes(self, bytes):
+        end = self.reserve(4 + len(bytes))
+        _structs["I"].pack_into(self.buffer, self.i, len(bytes))
+        self.buffer[self.i+4:end] = bytes
+        self.i = end
+
+    def write_string(self, ustr):
+        self.write_bytes(self.codec.encode(ustr)[0])
+
+    def write_ProtocolVersion(self, version, subversion):
+        self.write_struct("HH", version, subversion)
+
+    def write_FullInfo(self, fullinfo):
+        self.write_TrainerTeam(fullinfo.team)
+        self.write_struct("BB", fullinfo.ladder, fullinfo.showteam)
+        self.write_Color(fullinfo.nameColor)
+
+    def write_TrainerTeam(self, team):
+        self.write_string(team.nick)
+        self.write_string(team.info)
+        self.write_string(team.lose)
+        self.write_string(team.win)
+        self.write_number("H", team.avatar)
+        self.write_string(team.defaultTier)
+        self.write_Team(team.team)
+
+    def write_Team(self, team):
+        self.write_number("B", team.gen)
         for k in xrange(6):
-            t.pokes[k] = self.decode_ShallowShownPoke(cmd, i)
+            self.write_PokePersonal(team.poke[k])
+
+    def write_PokePersonal(self, poke):
+        self.write_PokeUniqueId(poke.uniqueid)
+        self.write_string(poke.nickname)
+        self.write_struct("HHBBBBB4I6B6B", poke.item, poke.ability, poke.nature, poke.gender, poke.shiny, poke.happiness, poke.level,
+                          *(list(poke.move) + list(poke.dv) + list(poke.ev)))
+
+    def write_PlayerInfo(self, playerInfo):
+        self.write_number("i", playerInfo.id)
+        self.write_string(playerInfo.name)
+        self.write_string(playerInfo.info)
+        self.write_struct("bBh", playerInfo.auth, playerInfo.flags, playerInfo.rating)
+        for puid in playerInfo.pokemon:
+            self.write_PokeUniqueId(puid)
+        self.write_number("H", playerInfo.avatar)
+        self.write_string(playerInfo.tier)
+        self.write_Color(playerInfo.color)
+        self.write_number("B", playerInfo.gen)
+
+    def write_PokeUniqueId(self, uid):
+        self.write_struct("HB", uid.pokenum, uid.subnum)
+
+    def write_Color(self, color):
+        self.write_struct("bhhhhh", color.color_spec, color.alpha, color.red, color.green, color.blue, color.pad)
+
+    def write_ChallengeInfo(self, info):
+        self.write_struct("biIB", info.dsc, info.opp, info.clauses, info.mode)
+
+    def write_BattleChoice(self, choice):
+        self.write_struct("BB", choice.slot, choice.type)
+        if choice.type == BattleChoice.SwitchType:
+            self.write_number("b", choice.pokeSlot)
+        elif choice.type == BattleChoice.AttackType:
+            self.write_struct("bb", choice.attackSlot, choice.attackTarget)
+        elif choice.type == BattleChoice.RearrangeType:
+            self.write_struct("6b", *choice.pokeIndices)
+
+class FrameTemplate(object):
+    """
+    A whole frame, length prefix included, of an event whose arguments
+    are fixed width. fill() packs the arguments with one pack_into into
+    a copy of the template. Frames without arguments are constant,
+    fill() returns the same bytes every time.
+    """
+
+    def __init__(self, event, fmt=""):
+        self.struct = get_struct(fmt) if fmt else None
+        size = self.struct.size if fmt else 0
+        self.frame = _structs["I"].pack(1 + size) + _structs["B"].pack(event) + "\0" * size
+
+    def fill(self, *args):
+        if self.struct is None:
+            return self.frame
+        frame = bytearray(self.frame)
+        self.struct.pack_into(frame, 5, *args)
+        return frame
+
+_templates = {}
+
+def frameTemplate(event, fmt=""):
+    """ The cached FrameTemplate of NetworkEvents[event] with arguments fmt """
+    try:
+        return _templates[event, fmt]
+    except KeyError:
+        t = _templates[event, fmt] = FrameTemplate(NetworkEvents[event], fmt)
         return t
 
-    # STILL IN OLD FORMAT
-    def decode_ShallowShownPoke(self, cmd, i):
-        poke = ShallowShownPoke()
-        poke.num, i = self.decode_PokeUniqueId(cmd, i)
-        poke.level, i = self.decode_number(cmd, "B")
-        poke.gender, i = self.decode_number(cmd, "B")
-        has_item, i = self.decode_number(cmd, "B")
-        self.item = has_item > 0
-        return poke
-
-    def decode_BattleMove(self):
-        bm = BattleMove()
-        bm.movenum = self.decode_number("H")
-        bm.PPs = self.decode_number("B")
-        bm.totalPPs = self.decode_number("B")
-        return bm
-
-    # STILL IN OLD FORMAT
-    def decode_BattleStats(self, cmd, i):
-        stats = BattleStats()
-        for k in xrange(5):
-            stats.stats[k], i = self.decode_number(cmd, i, "h")
-        return (stats, i)
-
-    # STILL IN OLD FORMAT
-    def decode_BattleDynamicInfo(self, cmd, i):
-        info = BattleDynamicInfo()
-        for k in xrange(7):
-            info.boosts[k], i = self.decode_number(cmd, i, "b")
-        info.flags, i = self.decode_number(cmd, i, "B")
-        return (info, i)
-
-    # STILL IN OLD FORMAT
-    def decode_ShallowBattlePoke(self, cmd, i):
-        sbp = ShallowBattlePoke()
-        sbp.num, i = self.decode_PokeUniqueId(cmd, i)
-        sbp.nick, i = self.decode_string(cmd, i)
-        sbp.lifePercent, i = self.decode_number(cmd, i, "B")
-        sbp.fullStatus, i = self.decode_number(cmd, i, "I")
-        sbp.gender, i = self.decode_number(cmd, i, "B")
-        sbp.shiny, i = self.decode_bool(cmd, i)
-        sbp.gender, i = self.decode_number(cmd, i, "B")
-        return (sbp, i)
+def _encoder(name):
+    """ POEncoder.encode_<name> returns what POWriter.write_<name> writes as bytes """
+    def encode(self, *args):
+        w = POWriter()
+        getattr(w, "write_%s" % name)(*args)
+        return bytes(w.getvalue())
+    encode.__name__ = "encode_%s" % name
+    return encode
 
-    def decode_List(self, decode_fun):
-        num = self.decode_number("I")
-        a = []
-        for j in range(num):
-            item = decode(self)
-            a.append(item)
-        return a
-     
 class POEncoder(object):
 
     def __init__(self):
@@ -315,80 +408,18 @@ class POEncoder(object):
 
     #### ENCODING METHODS
 
-    def encode_string(self, ustr):
-        bytes = self.codec.encode(ustr)[0]
-        packed = struct.pack("!I", len(bytes)) + bytes
-        return packed
-
-    def encode_bytes(self, bytes):
-        packed = struct.pack("!I", len(bytes)) + bytes
-        return packed
-
-    def encode_ProtocolVersion(self, version, subversion):
-        return struct.pack("!HH", version, subversion)
-
-    def encode_FullInfo(self, fullinfo):
-        bytes = self.encode_TrainerTeam(fullinfo.team)
-        bytes += struct.pack("B", fullinfo.ladder)
-        bytes += struct.pack("B", fullinfo.showteam)
-        bytes += self.encode_Color(fullinfo.nameColor)
-        return bytes
-
-    def encode_TrainerTeam(self, team):
-        bytes = self.encode_string(team.nick)
-        bytes += self.encode_string(team.info)
-        bytes += self.encode_string(team.lose)
-        bytes += self.encode_string(team.win)
-        bytes += struct.pack("!H", team.avatar)
-        bytes += self.encode_string(team.defaultTier)
-        bytes += self.encode_Team(team.team)
-        return bytes
-
-    def encode_Team(self, team):
-        bytes = struct.pack("B", team.gen)
-        for k in xrange(6):
-            bytes += self.encode_PokePersonal(team.poke[k])
-        return bytes
-
-    def encode_PokePersonal(self, poke):
-        bytes = self.encode_PokeUniqueId(poke.uniqueid)
-        bytes += self.encode_string(poke.nickname)
-        bytes += struct.pack("!HHBBBBB", poke.item, poke.ability, poke.nature, poke.gender, poke.shiny, poke.happiness, poke.level)
-        bytes += struct.pack("!4I", *poke.move)
-        bytes += struct.pack("!6B", *poke.dv)
-        bytes += struct.pack("!6B", *poke.ev)
-        return bytes
-        
-    def encode_PlayerInfo(self, playerInfo):
-        return struct.pack("!i", playerInfo.id) +\
-        self.encode_string(playerInfo.name) +\
-        self.encode_string(playerInfo.info) +\
-        struct.pack("!bBh", playerInfo.auth,
-        playerInfo.flags, playerInfo.rating) +\
-        "".join(self.encode_PokeUniqueId(puid) for puid in playerInfo.pokemon) +\
-        struct.pack("!H", playerInfo.avatar) +\
-        self.encode_string(playerInfo.tier) +\
-        self.encode_Color(playerInfo.color) +\
-        struct.pack("!B", playerInfo.gen)
-
-    def encode_PokeUniqueId(self, uid):
-        return struct.pack("!HB", uid.pokenum, uid.subnum)
-
-    def encode_Color(self, color):
-        return struct.pack("!bhhhhh", color.color_spec, color.alpha, color.red, color.green, color.blue, color.pad)
-
-    def encode_ChallengeInfo(self, info):
-        return struct.pack("!biIB", info.dsc, info.opp, info.clauses, info.mode)
-
-    def encode_BattleChoice(self, choice):
-        ret = struct.pack("!BB", choice.slot, choice.type)
-        if command.type == BattleChoice.SwitchType:
-            ret += struct.pack("!b", choice.pokeSlot);
-        elif command.type == BattleChoice.AttackType:
-            ret += struct.pack("!bb", choice.attackSlot, attackTarget)
-        elif command.type == BattleChoice.RearrangeType:
-            ret += struct.pack("!bbbbbb", *choice.pokeIndices)
-        return ret
+    encode_string = _encoder("string")
+    encode_bytes = _encoder("bytes")
+    encode_ProtocolVersion = _encoder("ProtocolVersion")
+    encode_FullInfo = _encoder("FullInfo")
+    encode_TrainerTeam = _encoder("TrainerTeam")
+    encode_Team = _encoder("Team")
+    encode_PokePersonal = _encoder("PokePersonal")
+    encode_PlayerInfo = _encoder("PlayerInfo")
+    encode_PokeUniqueId = _encoder("PokeUniqueId")
+    encode_Color = _encoder("Color")
+    encode_ChallengeInfo = _encoder("ChallengeInfo")
+    encode_BattleChoice = _encoder("BattleChoice")
 
 class PORegistryClient(object):
 
@@ -442,7 +473,57 @@ def battleCommandParser(func):
         if hasattr(self, commonCallback):
             getattr(self, commonCallback)(battleCmd, bid, spot, *args)
     onBattleCommand.__name__ = battleCmd
+    onBattleCommand.command = battleCmd
+    onBattleCommand.parser = func
     return onBattleCommand
+
+def _overriddenCallback(cls, name):
+    """ Returns the function of callback name in cls, None if it is the no-op of POClient """
+    callback = getattr(cls, name, None)
+    callback = getattr(callback, "__func__", callback)
+    if callback is None or callback is POClient.__dict__.get(name):
+        return None
+    return callback
+
+_battleTables = {}
+
+def battleCommandTable(cls):
+    """
+    Resolves the battle command handling of cls once.
+    Returns, for every battle command number, a tuple
+    (command name, parser, own callback, common callback) of functions,
+    a callback is None when cls does not override it.
+    Callbacks set on an instance, client.onBattleKo = f, are not in the
+    table, POClient.battleEvent looks them up on the instance.
+    """
+    try:
+        return _battleTables[cls]
+    except KeyError:
+        pass
+    common = _overriddenCallback(cls, "onBattleCommand")
+    table = []
+    for msgnro in xrange(256):
+        name = BattleCommandNames[msgnro] if msgnro < len(BattleCommandNames) else None
+        if name is None:
+            name = "ProtocolError"
+        elif not hasattr(cls, "on_Battle_"+name):
+            name = "NotImplemented"
+        handler = getattr(cls, "on_Battle_"+name)
+        handler = getattr(handler, "__func__", handler)
+        if hasattr(handler, "parser"):
+            table.append((handler.command, handler.parser,
+                          _overriddenCallback(cls, "onBattle"+handler.command), common))
+        else:
+            # not a battleCommandParser, e.g. an override written before
+            # parsers took a PODecoder: it gets the bytes of the command
+            # after spot as it used to, and handles the command by itself.
+            # Returning None keeps the command from battleEvent.
+            def parser(self, bid, spot, cmd, handler=handler):
+                handler(self, bid, spot, cmd.cmd[cmd.i:])
+            parser.handler = handler
+            table.append((name, parser, None, None))
+    _battleTables[cls] = table
+    return table
         
 
 class POClient(POEncoder):
@@ -450,16 +531,61 @@ class POClient(POEncoder):
     Implements POProtocol
     """
 
+    # Decode frames through a memoryview: nested payloads such as battle
+    # messages are handed out as sub-views instead of copies.
+    # Handlers then receive memoryviews where they would get bytes.
+    # Strings are decoded, and so copied, by the on_ handlers as before.
+    zerocopy = False
+
+    # Names of structs the handlers never look at, e.g. ("TeamBattle",).
+    # Their decoders skip them and return None, see PODecoder.
+    # Skipping PlayerInfo changes the shape of two events: onPlayersList
+    # gets None for every player and onSendTeam gets None, and neither
+    # updates world nor playerTable. Login always decodes our own player.
+    skippedStructures = ()
+
+    # Queue outgoing frames and write them to the transport together:
+    # at the next event loop iteration, after coalesceMaxDelay seconds
+    # when it is not 0, as soon as coalesceMaxBytes are queued,
+    # or when flush() is called.
+    coalesce = False
+    coalesceMaxBytes = 65536
+    coalesceMaxDelay = 0
+
+    # A capture.Recorder appending every frame received and sent
+    recorder = None
+
     def stringReceived(self, cmd):
-        cmd = PODecoder(cmd)
+        if self.recorder is not None:
+            self.recorder.inbound(cmd)
+        self.dispatchFrame(cmd)
+
+    def dispatchFrame(self, cmd):
+        """ Calls the on_ handler of the frame cmd """
+        cmd = PODecoder(memoryview(cmd) if self.zerocopy else cmd, self.skippedStructures)
         ev = cmd.decode_number("B")
-        evname = EventNames[ev] if 0 <= ev <= len(EventNames) else None
-        if evname is None:
-            self.on_ProtocolError(ev, cmd)
-        if hasattr(self, "on_"+evname):
-            getattr(self, "on_"+evname)(cmd)
-        else:
-            self.on_NotImplemented(ev, cmd)
+        try:
+            dispatch = self._dispatch
+        except AttributeError:
+            dispatch = self._dispatch = self.dispatchTable()
+        dispatch[ev](cmd)
+
+    def dispatchTable(self):
+        """
+        Returns the handlers of all the 256 possible events, bound to self.
+        Built on the first frame received: if on_ handlers are replaced
+        afterwards, del self._dispatch to have it rebuilt.
+        """
+        table = []
+        for ev in xrange(256):
+            evname = EventNames.get(ev)
+            if evname is None:
+                table.append(functools.partial(self.on_ProtocolError, ev))
+            elif hasattr(self, "on_"+evname):
+                table.append(getattr(self, "on_"+evname))
+            else:
+                table.append(functools.partial(self.on_NotImplemented, ev))
+        return table
 
     def on_NotImplemented(self, ev, cmd):
         evname = EventNames[ev]
@@ -477,143 +603,244 @@ class POClient(POEncoder):
     version = (0,0)
 
     def login(self, name, **kwargs):
-        data =  struct.pack('B', NetworkEvents['Login'])
-        data += self.encode_ProtocolVersion(*self.version)
+        w = self.newFrame(NetworkEvents['Login'])
+        w.write_ProtocolVersion(*self.version)
         # hasClientType = (1 << 0)
         # hasVersionNumber = (1 << 1)
         # hasDefaultChannel = (1 << 3)
-        network_flags = struct.pack("!B", (1 << 0) | (1 << 1) | (1 << 3))
-        data += network_flags
-        data += self.encode_string(kwargs.get('clientType', u"python"))
-        data += struct.pack('!H', 0x200)
-        data += self.encode_string(name)
+        network_flags = (1 << 0) | (1 << 1) | (1 << 3)
+        w.write_number("B", network_flags)
+        w.write_string(kwargs.get('clientType', u"python"))
+        w.write_number("H", 0x200)
+        w.write_string(name)
         # wantsIdsWithMessages
-        data_flags = struct.pack("!B", 16)
-        data += data_flags
-        data += self.encode_string(kwargs.get('defaultChannel', u"default"))
-        print "Sending login packet of " + str(len(data)) + " bytes"
-        whole_packet = struct.pack('!I', len(data))+data
-        print "PACKET: [" + " ".join(str(ord(b)) for b in whole_packet) + "]"
-        print "Sent login packet of " + str(len(data)) + " bytes"
-        self.send(data)
+        data_flags = 16
+        if self.zipCompression:
+            # supportsZipCompression
+            data_flags |= 1
+        w.write_number("B", data_flags)
+        w.write_string(kwargs.get('defaultChannel', u"default"))
+        whole_packet = w.getvalue()
+        print "Sending login packet of " + str(len(whole_packet)-4) + " bytes"
+        print "PACKET: [" + " ".join(str(b) for b in whole_packet) + "]"
+        print "Sent login packet of " + str(len(whole_packet)-4) + " bytes"
+        self.sendFrame(whole_packet)
 
     def sendMessage(self, message):
-        tosend=struct.pack('B', NetworkEvents['SendMessage']) + self.encode_string(message)
-        self.send(tosend)
+        w = self.newFrame(NetworkEvents['SendMessage'])
+        w.write_string(message)
+        self.sendFrame(w.getvalue())
 
     def register(self):
-        tosend=struct.pack('B', NetworkEvents['Register'])
-        self.send(tosend)
+        self.sendFrame(frameTemplate('Register').fill())
 
     def askForPass(self, u):
-        tosend = struct.pack('B', NetworkEvents['AskForPass']) + self.encode_string(u)
-        self.send(tosend) 
+        w = self.newFrame(NetworkEvents['AskForPass'])
+        w.write_string(u)
+        self.sendFrame(w.getvalue())
 
     def sendTeam(self, trainerteam):
-        tosend = struct.pack('B', NetworkEvents['SendTeam']) + self.encode_TrainerTeam(trainerteam)
-        self.send(tosend)
+        w = self.newFrame(NetworkEvents['SendTeam'], 1024)
+        w.write_TrainerTeam(trainerteam)
+        self.sendFrame(w.getvalue())
 
     def challengeStuff(self, challengeinfo):
-        tosend = struct.pack('B', NetworkEvents['ChallengeStuff']) + self.encode_ChallengeInfo(challengeinfo)
-        self.send(tosend)
+        w = self.newFrame(NetworkEvents['ChallengeStuff'])
+        w.write_ChallengeInfo(challengeinfo)
+        self.sendFrame(w.getvalue())
 
     def spectateBattle(self, battleid):
-        tosend = struct.pack('!Bi', NetworkEvents['SpectateBattle'], battleid)
-        self.send(tosend)
+        self.sendFrame(frameTemplate('SpectateBattle', "i").fill(battleid))
 
     def spectatingBattleFinished(self, battleid):
-        tosend = struct.pack('!Bi', NetworkEvents['SpectatingBattleFinished'], battleid)
-        self.send(tosend)
+        self.sendFrame(frameTemplate('SpectatingBattleFinished', "i").fill(battleid))
 
     def battleCommand(self, battleid, slot, battlecommand):
-        tosend = struct.pack('!BiB', NetworkEvents['BattleCommand'], battleid, slot) + self.encode_BattleChoice(battlecommand)
-        self.send(tosend)
+        # battle choices travel as BattleMessage to the server
+        w = self.newFrame(NetworkEvents['BattleMessage'])
+        w.write_struct("iB", battleid, slot)
+        w.write_BattleChoice(battlecommand)
+        self.sendFrame(w.getvalue())
 
     def battleFinished(self, battleid, result):
-        tosend = struct.pack('!Bii', NetworkEvents['BattleFinished'], battleid, result)
-        self.send(tosend)
+        self.sendFrame(frameTemplate('BattleFinished', "ii").fill(battleid, result))
 
     def battleChat(self, battleid, message):
-        tosend = struct.pack('!BI', NetworkEvents['BattleChat'], battleid) + self.encode_string(message)
-        self.send(tosend)
+        w = self.newFrame(NetworkEvents['BattleChat'])
+        w.write_number("I", battleid)
+        w.write_string(message)
+        self.sendFrame(w.getvalue())
 
     def spectatingBattleChat(self, battleid, message):
-        tosend = struct.pack('!BI', NetworkEvents['SpectatingBattleChat'], battleid) + self.encode_string(message)
-        self.send(tosend)
+        w = self.newFrame(NetworkEvents['SpectatingBattleChat'])
+        w.write_number("I", battleid)
+        w.write_string(message)
+        self.sendFrame(w.getvalue())
 
     def sendPM(self, playerid, message):
-        tosend = struct.pack('!BI', NetworkEvents['SendPM'], playerid) + self.encode_string(message)
-        self.send(tosend)
+        w = self.newFrame(NetworkEvents['SendPM'])
+        w.write_number("I", playerid)
+        w.write_string(message)
+        self.sendFrame(w.getvalue())
 
     def sendChannelMessage(self, chanid, message):
-        tosend = struct.pack('!BI', NetworkEvents['ChannelMessage'], chanid) + self.encode_string(message)
-        self.send(tosend)
+        w = self.newFrame(NetworkEvents['ChannelMessage'])
+        w.write_number("I", chanid)
+        w.write_string(message)
+        self.sendFrame(w.getvalue())
 
     def joinChannel(self, channelname):
-        tosend = struct.pack('B', NetworkEvents['JoinChannel']) + self.encode_string(channelname)
-        self.send(tosend)
+        w = self.newFrame(NetworkEvents['JoinChannel'])
+        w.write_string(channelname)
+        self.sendFrame(w.getvalue())
 
     def partChannel(self, channel):
-        tosend = struct.pack('!Bi', NetworkEvents['LeaveChannel'], channel)
-        self.send(tosend)
+        self.sendFrame(frameTemplate('LeaveChannel', "i").fill(channel))
 
     def kick(self, player):
-        tosend = struct.pack('!Bi', NetworkEvents['PlayerKick'], player)
-        self.send(tosend)
+        self.sendFrame(frameTemplate('PlayerKick', "i").fill(player))
 
     def ban(self, player):
-        tosend = struct.pack('!Bi', NetworkEvents['PlayerBan'], player)
-        self.send(tosend)
+        self.sendFrame(frameTemplate('PlayerBan', "i").fill(player))
 
     def nameBan(self, name):
-        tosend = struct.pack('!Bi', NetworkEvents['CPBan'], self.encode_string(name))
-        self.send(tosend)
+        w = self.newFrame(NetworkEvents['CPBan'])
+        w.write_string(name)
+        self.sendFrame(w.getvalue())
 
     def away(self, away):
-        tosend = struct.pack('!BB', NetworkEvents['Away'], int(True if away else False))
-        self.send(tosend)
+        self.sendFrame(frameTemplate('Away', "B").fill(1 if away else 0))
 
     def setProxyIP(self, data):
-        tosend = struct.pack('B', NetworkEvents['SetIP']) + self.encode_string(data)
-        self.send(tosend)
+        w = self.newFrame(NetworkEvents['SetIP'])
+        w.write_string(data)
+        self.sendFrame(w.getvalue())
+
+    def newFrame(self, event, capacity=256):
+        """
+        Returns a POWriter for a whole frame, length prefix
+        reserved and event number already written
+        """
+        w = POWriter(capacity, framed=True)
+        w.write_number("B", event)
+        return w
 
     def send(self, data):
         data = struct.pack('!I', len(data))+data
-        self.native_send(data)
-        
+        self.sendFrame(data)
+
+    def sendFrame(self, frame):
+        """
+        Sends data framed already, length prefix included
+        """
+        if self.recorder is not None:
+            self.recorder.outbound(frame)
+        if not self.coalesce:
+            self.native_send(frame)
+            return
+        # frames are queued into one buffer reused from batch to batch
+        outgoing = getattr(self, "_outgoing", None)
+        if outgoing is None:
+            outgoing = self._outgoing = FrameEncoder(self.coalesceMaxBytes)
+        first = not outgoing
+        outgoing.writeFrame(frame)
+        if len(outgoing) >= self.coalesceMaxBytes:
+            self.flush()
+        elif first:
+            self.scheduleFlush(self.coalesceMaxDelay)
+
+    def flush(self):
+        """
+        Writes the frames queued in coalescing mode to the transport
+        """
+        outgoing = getattr(self, "_outgoing", None)
+        if outgoing:
+            self.native_send(outgoing.take())
+
+    def scheduleFlush(self, delay):
+        """
+        Called when the first frame is queued in coalescing mode, should
+        arrange for flush() to be called after delay seconds, or on the
+        next event loop iteration when delay is 0. Interfaces implement it;
+        without an event loop flush() has to be called explicitly.
+        """
+        pass
 
     ### Battle Messages and their handling
 
+    # A battlestate.BattleStates applying every battle command, its states
+    # are dropped on BattleFinished and SpectatingBattleFinished
+    battleStates = None
+
+    # A sharding.BattleShards parsing the battle commands in worker
+    # processes, the parsed commands come back through battleEvent
+    battleShards = None
+
     def handleBattleCommand(self, battleid, bytes):
-        msgnro, i = self.decode_number(bytes, 0, "B")
-        spot, i = self.decode_number(bytes, i, "B")
-        name = BattleCommandNames[msgnro] if 0 <= msgnro <= len(BattleCommandNames) else None
-        if name:
-            if hasattr(self, "on_Battle_"+name):
-                getattr(self, "on_Battle_"+name)(battleid, spot, bytes[i:])
-            else:
-                self.on_Battle_NotImplemented(battleid, spot, bytes)
-        else:
-            self.on_Battle_ProtocolError(battleid, spot, bytes)
+        if self.battleShards is not None:
+            self.battleShards.submit(battleid, bytes)
+            return
+        # bytes may be a memoryview in zerocopy mode, the decoder
+        # reads it in place and the parsers never slice it
+        cmd = PODecoder(bytes)
+        msgnro = cmd.decode_number("B")
+        spot = cmd.decode_number("B")
+        command, parser, ownCallback, commonCallback = battleCommandTable(self.__class__)[msgnro]
+        args = parser(self, battleid, spot, cmd)
+        if args is None:
+            if not hasattr(parser, "handler"):
+                print "Args is none for command %s" % command
+            return
+        self.battleEvent(battleid, spot, msgnro, args)
+
+    def onBattleParseError(self, battleid, payload, error):
+        """
+        Event telling us that the parser of a battle command raised in
+        a worker of battleShards, unsharded parsers raise it in place
+        battleid : int - the id of the battle
+        payload : bytes - the battle command
+        error : str - repr of the exception
+        """
+        print "Error parsing battle command for battle=%d: %s" % (battleid, error)
+
+    def battleEvent(self, battleid, spot, msgnro, args):
+        """
+        Calls the callbacks of the battle command msgnro parsed into args
+        """
+        command, parser, ownCallback, commonCallback = battleCommandTable(self.__class__)[msgnro]
+        if self.battleStates is not None:
+            self.battleStates.apply(command, battleid, spot, args)
+        # callbacks set on the instance win over the ones of the class
+        instance = self.__dict__
+        own = instance.get("onBattle" + command)
+        if own is not None:
+            own(battleid, spot, *args)
+        elif ownCallback is not None:
+            ownCallback(self, battleid, spot, *args)
+        common = instance.get("onBattleCommand")
+        if common is not None:
+            common(command, battleid, spot, *args)
+        elif commonCallback is not None:
+            commonCallback(self, command, battleid, spot, *args)
 
     @battleCommandParser
-    def on_Battle_NotImplemented(self, bid, spot, bytes):
+    def on_Battle_NotImplemented(self, bid, spot, cmd):
         print "Not implemented Battle Protocol:"
-        print tuple(ord(i) for i in bytes)
+        print tuple(ord(i) for i in cmd.cmd)
         return()
 
     @battleCommandParser
-    def on_Battle_ProtocolError(self, bid, spot, bytes):
-        print "Error in Protocol for battle=%d, event=%d, spot=%d" % (bid, bytes[0], bytes[1])
-        print tuple(ord(i) for i in bytes)
+    def on_Battle_ProtocolError(self, bid, spot, cmd):
+        print "Error in Protocol for battle=%d, event=%d, spot=%d" % (bid, ord(cmd.cmd[0]), spot)
+        print tuple(ord(i) for i in cmd.cmd)
         print BattleCommandNames
         return ()
 
     @battleCommandParser
-    def on_Battle_SendOut(self, bid, spot, bytes):
-        silent, i = self.decode_bool(bytes, 0)
-        prevIndex, i = self.decode_number(bytes, i, "B")
-        poke, i = self.decode_ShallowBattlePoke(bytes, i)
+    def on_Battle_SendOut(self, bid, spot, cmd):
+        silent = cmd.decode_bool()
+        prevIndex = cmd.decode_number("B")
+        poke = cmd.decode_ShallowBattlePoke()
         return (silent, prevIndex, poke)
 
     def onBattleSendOut(self, bid, spot, silent, prevIndex, poke):
@@ -626,7 +853,7 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_SendBack(self, bid, spot, bytes):
+    def on_Battle_SendBack(self, bid, spot, cmd):
         return ()
 
     def onBattleSendBack(self, bid, spot):
@@ -636,12 +863,12 @@ class POClient(POEncoder):
         spot : int - spot in the field
         """
     @battleCommandParser
-    def on_Battle_OfferChoice(self, bid, spot, bytes):
+    def on_Battle_OfferChoice(self, bid, spot, cmd):
         pass # TODO interactive stuff
 
     @battleCommandParser
-    def on_Battle_UseAttack(self, bid, spot, bytes):
-        attack, i = self.decode_number(bytes, 0, "!H")
+    def on_Battle_UseAttack(self, bid, spot, cmd):
+        attack = cmd.decode_number("H")
         return (attack,)
 
     def onBattleUseAttack(self, bid, spot, attack):
@@ -653,8 +880,8 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_BeginTurn(self, bid, spot, bytes):
-        turn, i = self.decode_number(bytes, 0, "i")
+    def on_Battle_BeginTurn(self, bid, spot, cmd):
+        turn = cmd.decode_number("i")
         return (turn,)
 
     def onBattleBeginTurn(self, bid, spot, turn):
@@ -666,12 +893,12 @@ class POClient(POEncoder):
         """
  
     @battleCommandParser
-    def on_Battle_ChangePP(self, bid, spot, bytes):
+    def on_Battle_ChangePP(self, bid, spot, cmd):
         pass # TODO interactive stuff
 
     @battleCommandParser
-    def on_Battle_ChangeHp(self, bid, spot, bytes):
-        hp, i = self.decode_number(bytes, 0, "!H") 
+    def on_Battle_ChangeHp(self, bid, spot, cmd):
+        hp = cmd.decode_number("H") 
         return (hp,)
 
     def onBattleChangeHp(self, bid, spot, hp):
@@ -683,7 +910,7 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_Ko(self, bid, spot, bytes):
+    def on_Battle_Ko(self, bid, spot, cmd):
         return ()
 
     def onBattleKo(self, bid, spot):
@@ -694,8 +921,8 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_Effective(self, bid, spot, bytes):
-        eff, i = self.decode_number(bytes, 0, "B")
+    def on_Battle_Effective(self, bid, spot, cmd):
+        eff = cmd.decode_number("B")
         return (eff,)
 
     def onBattleEffective(self, bid, spot, eff):
@@ -707,7 +934,7 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_Miss(self, bid, spot, bytes):
+    def on_Battle_Miss(self, bid, spot, cmd):
         return ()
 
     def onBattleMiss(self, bid, spot):
@@ -718,7 +945,7 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_CriticalHit(self, bid, spot, bytes):
+    def on_Battle_CriticalHit(self, bid, spot, cmd):
         return ()
 
     def onBattleCriticalHit(self, bid, spot):
@@ -729,7 +956,7 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_Hit(self, bid, spot, bytes):
+    def on_Battle_Hit(self, bid, spot, cmd):
         return ()
 
     def onBattleHit(self, bid, spot):
@@ -740,9 +967,9 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_StatChange(self, bid, spot, bytes):
-        stat, i = self.decode_number(bytes, 0, "b")
-        boost, i = self.decode_number(bytes, i, "b")
+    def on_Battle_StatChange(self, bid, spot, cmd):
+        stat = cmd.decode_number("b")
+        boost = cmd.decode_number("b")
         return (stat, boost)
 
     def onBattleStatChange(self, bid, spot, stat, boost):
@@ -755,9 +982,9 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_StatusChange(self, bid, spot, bytes):
-        status, i = self.decode_number(bytes, 0, "b")
-        multiturn, i = self.decode_number(bytes, i, "B")
+    def on_Battle_StatusChange(self, bid, spot, cmd):
+        status = cmd.decode_number("b")
+        multiturn = cmd.decode_number("B")
         return (status, multiturn > 0)
 
     def onBattleStatusChange(self, bid, spot, status, multiturn):
@@ -770,8 +997,8 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_StatusMessage(self, bid, spot, bytes):
-        statusmessage, i = self.decode_number(bytes, 0, "b")
+    def on_Battle_StatusMessage(self, bid, spot, cmd):
+        statusmessage = cmd.decode_number("b")
 
         # StatusFeeling
         statusmessage = {
@@ -796,8 +1023,8 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_Failed(self, bid, spot, bytes):
-        silent, i = self.decode_bool(bytes, 0)
+    def on_Battle_Failed(self, bid, spot, cmd):
+        silent = cmd.decode_bool()
         return (silent,)
 
     def onBattleFailed(self, bid, spot, silent):
@@ -807,8 +1034,8 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_BattleChat(self, bid, spot, bytes):
-        message, i = self.decode_string(bytes, 0)
+    def on_Battle_BattleChat(self, bid, spot, cmd):
+        message = cmd.decode_string()
         return (message,)
 
     def onBattleBattleChat(self, bid, spot, message):
@@ -818,13 +1045,13 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_MoveMessage(self, bid, spot, bytes):
-        move, i = self.decode_number(bytes, 0, "!H")
-        part, i = self.decode_number(bytes, i, "B")
-        type, i = self.decode_number(bytes, i, "b")
-        foe, i = self.decode_number(bytes, i, "b")
-        other, i = self.decode_number(bytes, i, "!h")
-        q, i = self.decode_string(bytes, i)
+    def on_Battle_MoveMessage(self, bid, spot, cmd):
+        move = cmd.decode_number("H")
+        part = cmd.decode_number("B")
+        type = cmd.decode_number("b")
+        foe = cmd.decode_number("b")
+        other = cmd.decode_number("h")
+        q = cmd.decode_string()
         return (move, part, type, foe, other, q)
 
     def onBattleMoveMessage(self, bid, spot, move, part, type, foe, other, q):
@@ -839,12 +1066,12 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_ItemMessage(self, bid, spot, bytes):
-        item, i = self.decode_number(bytes, 0, "!H")
-        part, i = self.decode_number(bytes, i, "B")
-        foe, i = self.decode_number(bytes, i, "b")
-        berry, i = self.decode_number(bytes, i, "!H")
-        other, i = self.decode_number(bytes, i, "!H")
+    def on_Battle_ItemMessage(self, bid, spot, cmd):
+        item = cmd.decode_number("H")
+        part = cmd.decode_number("B")
+        foe = cmd.decode_number("b")
+        berry = cmd.decode_number("H")
+        other = cmd.decode_number("H")
         return (item, part, foe, berry, other)
 
     def onBattleItemMessage(self, bid, spot, item, part, foe, berry, other):
@@ -853,7 +1080,7 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_NoOpponent(self, bid, spot, bytes):
+    def on_Battle_NoOpponent(self, bid, spot, cmd):
         return ()
 
     def onBattleNoOpponent(self, bid, spot):
@@ -862,7 +1089,7 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_Flinch(self, bid, spot, bytes):
+    def on_Battle_Flinch(self, bid, spot, cmd):
         return ()
 
     def onBattleFlinch(self, bid, spot):
@@ -871,8 +1098,8 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_Recoil(self, bid, spot, bytes):
-        damage, i = self.decode_number(bytes, 0, "B")
+    def on_Battle_Recoil(self, bid, spot, cmd):
+        damage = cmd.decode_number("B")
         return (damage,)
 
     def onBattleRecoil(self, bid, spot, damage):
@@ -881,9 +1108,9 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_WeatherMessage(self, bid, spot, bytes):
-        wstatus, i = self.decode_number(bytes, 0, "B")
-        weather, i = self.decode_number(bytes, i, "B")
+    def on_Battle_WeatherMessage(self, bid, spot, cmd):
+        wstatus = cmd.decode_number("B")
+        weather = cmd.decode_number("B")
 
         # WeatherM
         wstatus = {
@@ -909,8 +1136,8 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_StraightDamage(self, bid, spot, bytes):
-        damage, i = self.decode_number(bytes, 0, "!H")
+    def on_Battle_StraightDamage(self, bid, spot, cmd):
+        damage = cmd.decode_number("H")
         return (damage,)
 
     def onBattleStraightDamage(self, bid, spot, damage):
@@ -919,12 +1146,12 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_AbilityMessage(self, bid, spot, bytes):
-        ab, i = self.decode_number(bytes, 0, "!H")
-        part, i = self.decode_number(bytes, i, "B")
-        type, i = self.decode_number(bytes, i, "b")
-        foe, i = self.decode_number(bytes, i, "b")
-        other, i = self.decode_number(bytes, i, "!h")
+    def on_Battle_AbilityMessage(self, bid, spot, cmd):
+        ab = cmd.decode_number("H")
+        part = cmd.decode_number("B")
+        type = cmd.decode_number("b")
+        foe = cmd.decode_number("b")
+        other = cmd.decode_number("h")
         return (ab, part, type, foe, other)
 
     def onBattleAbilityMessage(self, bid, spot, ab, part, type, foe, other):
@@ -933,9 +1160,9 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_AbsStatusChange(self, bid, spot, bytes):
-        poke, i = self.decode_number(bytes, 0, "b")
-        status, i = self.decode_number(bytes, i, "b")
+    def on_Battle_AbsStatusChange(self, bid, spot, cmd):
+        poke = cmd.decode_number("b")
+        status = cmd.decode_number("b")
         return (poke, status)
 
     def onBattleAbsStatusChange(self, bid, spot, poke, status):
@@ -944,135 +1171,136 @@ class POClient(POEncoder):
         """
 
     @battleCommandParser
-    def on_Battle_Substitute(self, bid, spot, bytes):
-        is_sub, i = self.decode_number(bytes, 0, "b")
+    def on_Battle_Substitute(self, bid, spot, cmd):
+        is_sub = cmd.decode_number("b")
         return (is_sub > 0,)
 
     @battleCommandParser
-    def on_Battle_BattleEnd(self, bid, spot, bytes):
-        res, i = self.decode_number(bytes, 0, "b")
+    def on_Battle_BattleEnd(self, bid, spot, cmd):
+        res = cmd.decode_number("b")
         return (BattleResult[res],)
 
     @battleCommandParser
-    def on_Battle_BlankMessage(self, bid, spot, bytes):
+    def on_Battle_BlankMessage(self, bid, spot, cmd):
         return ()
 
     @battleCommandParser
-    def on_Battle_CancelMove(self, bid, spot, bytes):
+    def on_Battle_CancelMove(self, bid, spot, cmd):
         return ()
 
     @battleCommandParser
-    def on_Battle_Clause (self, bid, spot, bytes):
+    def on_Battle_Clause (self, bid, spot, cmd):
         return ()
 
     @battleCommandParser
-    def on_Battle_DynamicInfo (self, bid, spot, bytes):
-        info, i = self.decode_BattleDynamicInfo(bytes, 0)
+    def on_Battle_DynamicInfo (self, bid, spot, cmd):
+        info = cmd.decode_BattleDynamicInfo()
         return (info,)
 
     @battleCommandParser
-    def on_Battle_DynamicStats (self, bid, spot, bytes):
-        stats, i = self.decode_BattleStats(bytes, 0)
+    def on_Battle_DynamicStats (self, bid, spot, cmd):
+        stats = cmd.decode_BattleStats()
         return (stats,)
 
     @battleCommandParser
-    def on_Battle_Spectating(self, bid, spot, bytes):
-        come, i = self.decode_number(bytes, 0, "b")
-        player, i = self.decode_number(bytes, i, "!i")
+    def on_Battle_Spectating(self, bid, spot, cmd):
+        come = cmd.decode_number("b")
+        player = cmd.decode_number("i")
         try:
-            name, i = self.decode_string(bytes, i)
+            name = cmd.decode_string()
         except:
             name = None
         return (come > 0, player, name)
 
     @battleCommandParser
-    def on_Battle_SpectatorChat(self, bid, spot, bytes):
-        player, i = self.decode_number(bytes, 0, "!i")
-        message, i = self.decode_string(bytes, i)
+    def on_Battle_SpectatorChat(self, bid, spot, cmd):
+        player = cmd.decode_number("i")
+        message = cmd.decode_string()
         return (player, message)
 
     @battleCommandParser
-    def on_Battle_AlreadyStatusMessage(self, bid, spot, bytes):
-        status, i = self.decode_number(bytes, 0, "B")
+    def on_Battle_AlreadyStatusMessage(self, bid, spot, cmd):
+        status = cmd.decode_number("B")
         return (status,)
 
     @battleCommandParser
-    def on_Battle_TempPokeChange(self, bid, spot, bytes):
-        type, i = self.decode_number(bytes, 0, "B")
+    def on_Battle_TempPokeChange(self, bid, spot, cmd):
+        type = cmd.decode_number("B")
         if type in (TempPokeChange['TempMove'], TempPokeChange['DefMove']):
-            slot, i = self.decode_number(bytes, i, "!b")
-            move, i = self.decode_number(bytes, i, "!h")
+            slot = cmd.decode_number("b")
+            move = cmd.decode_number("h")
             return ("MoveChange", slot, move, type == TempPokeChange['DefMove'])
         elif type in (TempPokeChange['TempPP'],):
-            slot, i = self.decode_number(bytes, i, "!B")
-            pp, i = self.decode_number(bytes, i, "!B")
+            slot = cmd.decode_number("B")
+            pp = cmd.decode_number("B")
             return ("TempPPChange", slot, pp)
         elif type in (TempPokeChange['TempSprite'],):
-            temp_sprite, i = self.decode_PokeUniqueId(bytes, i)
-            if temp_sprite.pokenum == -1:
+            temp_sprite = cmd.decode_pokeid()
+            # pokenum is unsigned: -1 on the server's side is 0xFFFF here
+            if temp_sprite.pokenum == 0xFFFF:
                 return ("PokemonVanish",)
-            elif temp_sprite == 0:
+            elif temp_sprite.pokenum == 0:
                 return ("PokemonReappear",)
             else:
                 return ("SpriteChange", temp_sprite)
             
         elif type in (TempPokeChange['DefiniteForme'],):
-            poke, i = self.decode_number(bytes, i, "!B")
-            poke_id, i = self.decode_PokeUniqueId(bytes, i)
+            poke = cmd.decode_number("B")
+            poke_id = cmd.decode_pokeid()
             return ("DefiniteFormeChange", poke, poke_id)
         elif type in (TempPokeChange['AestheticForme'],):
-            newforme, i = self.decode_number(bytes, i, "!H")
+            newforme = cmd.decode_number("H")
             return ("CosmeticFormeChange", newforme)
 
     @battleCommandParser
-    def on_Battle_ClockStart (self, bid, spot, bytes):
-        clock, i = self.decode_number(bytes, 0, "!H")
+    def on_Battle_ClockStart (self, bid, spot, cmd):
+        clock = cmd.decode_number("H")
         return (clock,)
 
     @battleCommandParser
-    def on_Battle_ClockStop (self, bid, spot, bytes):
-        clock, i = self.decode_number(bytes, 0, "!H")
+    def on_Battle_ClockStop (self, bid, spot, cmd):
+        clock = cmd.decode_number("H")
         return (clock,)
 
     @battleCommandParser
-    def on_Battle_Rated(self, bid, spot, bytes):
-        rated, i = self.decode_number(bytes, 0, "!B")
+    def on_Battle_Rated(self, bid, spot, cmd):
+        rated = cmd.decode_number("B")
         return (rated,)
 
     @battleCommandParser
-    def on_Battle_TierSection (self, bid, spot, bytes):
-        tier, i = self.decode_string(bytes, 0)
+    def on_Battle_TierSection (self, bid, spot, cmd):
+        tier = cmd.decode_string()
         return (tier,)
 
     @battleCommandParser
-    def on_Battle_EndMessage(self, bid, spot, bytes):
-        message, i = self.decode_string(bytes, 0)
+    def on_Battle_EndMessage(self, bid, spot, cmd):
+        message = cmd.decode_string()
         return (message,)
 
     @battleCommandParser
-    def on_Battle_PointEstimate(self, bid, spot, bytes):
-        first, i = self.decode_number(bytes, 0, "!B")
-        second, i = self.decode_number(bytes, i, "!B")
+    def on_Battle_PointEstimate(self, bid, spot, cmd):
+        first = cmd.decode_number("B")
+        second = cmd.decode_number("B")
         return (first, second)
 
     @battleCommandParser
-    def on_Battle_MakeYourChoice(self, bid, spot, bytes):
+    def on_Battle_MakeYourChoice(self, bid, spot, cmd):
         return ()
 
     @battleCommandParser
-    def on_Battle_Avoid(self, bid, spot, bytes):
+    def on_Battle_Avoid(self, bid, spot, cmd):
         return ()
 
     @battleCommandParser
-    def on_Battle_RearrangeTeam(self, bid, spot, bytes):
-        t, i = self.decode_ShallowShownTeam(bytes, 0)
+    def on_Battle_RearrangeTeam(self, bid, spot, cmd):
+        t = cmd.decode_ShallowShownTeam()
         return (t,)
 
     @battleCommandParser
-    def on_Battle_SpotShifts(self, bid, spot, bytes):
-        s1, i = self.decode_number(bytes, 0, "!B")
-        s2, i = self.decode_number(bytes, i, "!B")
-        silent, i = self.decode_number(bytes, i, "!B")
+    def on_Battle_SpotShifts(self, bid, spot, cmd):
+        s1 = cmd.decode_number("B")
+        s2 = cmd.decode_number("B")
+        silent = cmd.decode_number("B")
         return (s1, s2, silent > 0)
 
     def onBattleCommand(self, command, bid, spot, *args):
@@ -1080,13 +1308,74 @@ class POClient(POEncoder):
         The catch-all of battle commands.
         """
 
+    ### Compressed commands
+
+    # Tell the server at login that we accept ZipCommand
+    zipCompression = True
+
+    # ZipCommand is decompressed this many bytes at a time, the commands
+    # in it are dispatched as soon as they are decompressed
+    zipChunkSize = 65536
+
+    def on_ZipCommand(self, cmd):
+        # contentType 0 is one command, 1 a sequence of length prefixed
+        # commands. The data is compressed with qCompress: the size of
+        # the uncompressed data followed by a zlib stream
+        if len(cmd.cmd) < 6:
+            # too short for the header: an empty frame decodes as
+            # ZipCommand too and must not be inflated into itself
+            self.on_ProtocolError(NetworkEvents['ZipCommand'], cmd)
+            return
+        contentType = cmd.decode_number("B")
+        size = cmd.decode_number("I")
+        if isinstance(cmd.cmd, memoryview):
+            data = cmd.cmd[cmd.i:].tobytes()
+        else:
+            data = buffer(cmd.cmd, cmd.i)
+        inflater = zlib.decompressobj()
+        # the ZipCommand itself is what a recorder captures, the
+        # commands in it go to dispatchFrame. Nothing is inflated past
+        # the size announced plus one byte, which tells it was exceeded
+        try:
+            if contentType == 0:
+                command = "".join(inflate(inflater, data, size, size + 1))
+                if command and len(command) == size and stream_ended(inflater):
+                    self.dispatchFrame(command)
+                else:
+                    self.on_ProtocolError(NetworkEvents['ZipCommand'], cmd)
+                return
+            frames = FrameDecoder()
+            inflated = 0
+            for chunk in inflate(inflater, data, size, self.zipChunkSize):
+                inflated += len(chunk)
+                if inflated > size:
+                    # a bomb or a lie, the commands still buffered are dropped
+                    self.on_ProtocolError(NetworkEvents['ZipCommand'], cmd)
+                    return
+                self.dispatchFrames(frames.feed(chunk), cmd)
+        except zlib.error:
+            self.on_ProtocolError(NetworkEvents['ZipCommand'], cmd)
+            return
+        if frames.pending() or inflated != size or not stream_ended(inflater):
+            # truncated: the last command or the zlib stream, even if
+            # only its adler32 trailer, is cut short
+            self.on_ProtocolError(NetworkEvents['ZipCommand'], cmd)
+
+    def dispatchFrames(self, frames, zipCommand):
+        """ Dispatches the commands inflated from zipCommand, empty ones are errors """
+        for frame in frames:
+            if frame:
+                self.dispatchFrame(frame)
+            else:
+                self.on_ProtocolError(NetworkEvents['ZipCommand'], zipCommand)
+
     ### Events from connecting to server
 
     def on_VersionControl(self, cmd):
         current_version = cmd.decode_ProtocolVersion()
         hasZip = cmd.decode_number("B")
-        new_version = self.decode_ProtocolVersion()
-        compactability_version = self.decode_ProtocolVersion()
+        new_version = cmd.decode_ProtocolVersion()
+        compactability_version = cmd.decode_ProtocolVersion()
         major_compactability_version = cmd.decode_ProtocolVersion()
         name = cmd.decode_string()
         # Really, ignore all the useless stuff it isn't needed by clients
@@ -1115,12 +1404,22 @@ class POClient(POEncoder):
         salt = cmd.decode_string()
         self.onAskForPass(salt)
 
+    def onAskForPass(self, salt):
+        """
+        Event asking us for the password of our name
+        salt : unicode - the salt to hash the password with
+        """
+
     def on_Login(self, cmd):
         hasReconnect = cmd.decode_number("B")
         if hasReconnect > 0:
             reconnectPass = cmd.decode_bytes()
-        player = cmd.decode_PlayerInfo()
+        # our own player, decoded even when PlayerInfo is skipped
+        player = PODecoder.decode_PlayerInfo(cmd)
         tiers = cmd.decode_List(cmd.decode_string)
+        if self.world is not None:
+            self.world.me = player.id
+            self.world.updatePlayer(player)
         self.onLogin(player)
 
     def onLogin(self, playerInfo):
@@ -1131,6 +1430,10 @@ class POClient(POEncoder):
 
     def on_Logout(self, cmd):
         playerid = cmd.decode_number("i")
+        if self.playerTable is not None:
+            self.playerTable.remove(playerid)
+        if self.world is not None:
+            self.world.logout(playerid)
         self.onLogout(playerid)
 
     def onLogout(self, playerid):
@@ -1155,12 +1458,11 @@ class POClient(POEncoder):
     def on_TierSelection(self, cmd):
         tiers = {}
         stack = []
-        raw, _ = self.decode_bytes(cmd, 0)
+        raw = PODecoder(cmd.decode_bytes())
         pairs = []
-        i = 0
-        while i < len(raw):
-            currentLevel, i = self.decode_number(raw, i, "B")
-            name, i = self.decode_string(raw, i)
+        while raw.i < len(raw.cmd):
+            currentLevel = raw.decode_number("B")
+            name = raw.decode_string()
             pairs.append((currentLevel, name))
         self.onTierSelection(pairs)
 
@@ -1171,12 +1473,15 @@ class POClient(POEncoder):
         """
 
     def on_ChannelsList(self, cmd):
-        numitems, i = self.decode_number(cmd, 0, "!I")
+        numitems = cmd.decode_number("I")
         channels = []
         for k in xrange(numitems):
-            chanid, i = self.decode_number(cmd, i, "!i")
-            channame, i = self.decode_string(cmd, i) 
+            chanid = cmd.decode_number("i")
+            channame = cmd.decode_string()
             channels.append([chanid, channame])
+        if self.world is not None:
+            for chanid, channame in channels:
+                self.world.addChannel(chanid, channame)
         self.onChannelsList(channels)
 
     def onChannelsList(self, channels):
@@ -1185,23 +1490,53 @@ class POClient(POEncoder):
         channels : list of [int, unicode] - contains channel IDs and names
         """
 
+    # Decode PlayersList into LazyPlayerInfo objects. Each of them keeps
+    # the PlayersList frame alive until its lazy fields are decoded, so
+    # players kept in a world hold on to their frame, see LazyPlayerInfo.
+    # The playerTable copies the fields it needs and keeps no reference.
+    lazyPlayers = False
+
+    # A roster.PlayerTable kept up to date with PlayersList, SendTeam,
+    # Logout and Away. Note it reads the color of LazyPlayerInfo objects.
+    playerTable = None
+
+    # A world.World kept up to date with the players, channels and
+    # battles the server tells about
+    world = None
+
+    # A spectator.SpectatorManager spectating the battles of BattleList
+    # and ChannelBattle, it queues SpectatingBattleMessage
+    spectators = None
+
     def on_PlayersList(self, cmd):
-        i = 0
+        if self.lazyPlayers and "PlayerInfo" not in self.skippedStructures:
+            decode = cmd.decode_LazyPlayerInfo
+        else:
+            decode = cmd.decode_PlayerInfo
         players = []
-        while i < len(cmd):
-            player, i = self.decode_PlayerInfo(cmd, i)
-            players.append(player)
+        while cmd.i < len(cmd.cmd):
+            players.append(decode())
+        if players and players[0] is None:
+            # PlayerInfo is in skippedStructures
+            self.onPlayersList(players)
+            return
+        if self.playerTable is not None:
+            self.playerTable.extend(players)
+        if self.world is not None:
+            for player in players:
+                self.world.updatePlayer(player)
         self.onPlayersList(players)
 
     def onPlayersList(self, playerInfo):
         """
         Event containing the info of a player. Sent after log in.
         playerInfo : PlayerInfo - the info of the players, (list)
+            None for each of them when PlayerInfo is in skippedStructures
         """
 
     def on_PlayerBan(self, cmd):
-        playerid, i = self.decode_number(cmd, 0, "!i")
-        srcid, i = self.decode_number(cmd, i, "!i")
+        playerid = cmd.decode_number("i")
+        srcid = cmd.decode_number("i")
         self.onPlayerBan(playerid, srcid)
 
     def onPlayerBan(self, player, src):
@@ -1212,8 +1547,8 @@ class POClient(POEncoder):
         """
 
     def on_PlayerKick(self, cmd):
-        playerid, i = self.decode_number(cmd, 0, "!i")
-        srcid, i = self.decode_number(cmd, i, "!i")
+        playerid = cmd.decode_number("i")
+        srcid = cmd.decode_number("i")
         self.onPlayerKick(playerid, srcid)
 
     def onPlayerKick(self, player, src):
@@ -1224,14 +1559,16 @@ class POClient(POEncoder):
         """
 
     def on_BattleList(self, cmd):
-        channel, i = self.decode_number(cmd, 0, "!i")
-        j, i = self.decode_number(cmd, i, "!I")
-        battles = {}
-        for k in xrange(j):
-            bid, i = self.decode_number(cmd, i, "!I")
-            p1, i = self.decode_number(cmd, i, "!i")
-            p2, i = self.decode_number(cmd, i, "!i")
-            battles[bid] = (p1, p2)
+        channel, j = cmd.decode_struct("iI")
+        # (battle id, player1, player2) triples, all ids are positive
+        # so the unsigned battle id can be read along as "i"
+        ids = cmd.decode_numbers("i", 3*j)
+        battles = dict(zip(ids[0::3], zip(ids[1::3], ids[2::3])))
+        if self.world is not None:
+            self.world.addBattles(channel, battles)
+        if self.spectators is not None:
+            for battleid, (player1, player2) in battles.iteritems():
+                self.spectators.offer(channel, battleid, player1, player2)
         self.onBattleList(channel, battles)
 
     def onBattleList(self, channel, battles):
@@ -1245,8 +1582,10 @@ class POClient(POEncoder):
         """
 
     def on_SpectateBattle(self, cmd):
-        battleid, i = self.decode_number(cmd, 0, "!i")
-        battleconf, i = self.decode_BattleConfiguration(cmd, i)
+        battleid = cmd.decode_number("i")
+        battleconf = cmd.decode_BattleConfiguration()
+        if self.battleStates is not None:
+            self.battleStates.start(battleid)
         self.onSpectateBattle(battleid, battleconf)
 
     def onSpectateBattle(self, battleid, battleconf):
@@ -1257,8 +1596,11 @@ class POClient(POEncoder):
         """
 
     def on_SpectatingBattleMessage(self, cmd):
-        battleid, i = self.decode_number(cmd, 0, "!i")
-        b, i = self.decode_bytes(cmd, i)
+        battleid = cmd.decode_number("i")
+        b = cmd.decode_bytes()
+        if self.spectators is not None and self.spectators.message(battleid, b):
+            # handled when the manager processes the queue of the battle
+            return
         self.handleBattleCommand(battleid, b)
         self.onSpectatingBattleMessage(battleid, b)
         
@@ -1266,11 +1608,15 @@ class POClient(POEncoder):
         """
         Event telling us information about a battle.
         battleid : int - the battle id
-        command : bytes - arbitrary battle command
+        command : bytes - arbitrary battle command, a memoryview in zerocopy mode
         """
 
     def on_SpectatingBattleFinished(self, cmd):
-        battleid, i = self.decode_number(cmd, 0, "!i")
+        battleid = cmd.decode_number("i")
+        if self.battleStates is not None:
+            self.battleStates.remove(battleid)
+        if self.spectators is not None:
+            self.spectators.remove(battleid)
         self.onSpectatingBattleFinished(battleid)
 
     def onSpectatingBattleFinished(self, battleid):
@@ -1281,19 +1627,28 @@ class POClient(POEncoder):
 
     ### Pokemon related events
     def on_SendTeam(self, cmd):
-        player, i = self.decode_PlayerInfo(cmd, 0)
+        player = cmd.decode_PlayerInfo()
+        if player is None:
+            # PlayerInfo is in skippedStructures
+            self.onSendTeam(None)
+            return
+        if self.playerTable is not None:
+            self.playerTable.update(player)
+        if self.world is not None:
+            self.world.updatePlayer(player)
         self.onSendTeam(player)
 
     def onSendTeam(self, playerInfo):
         """
         Event telling us about a team change
-        playerInfo : PlayerInfo - the new info of the player
+        playerInfo : PlayerInfo - the new info of the player,
+            None when PlayerInfo is in skippedStructures
         """
 
     ### Battle related events
 
     def on_ChallengeStuff(self, cmd):
-        chall, i = self.decode_ChallengeInfo(cmd, 0)
+        chall = cmd.decode_ChallengeInfo()
         self.onChallengeStuff(chall)
 
     def onChallengeStuff(self, challengeInfo):
@@ -1303,12 +1658,12 @@ class POClient(POEncoder):
         """
 
     def on_EngageBattle(self, cmd):
-        battleid, i = self.decode_number(cmd, 0, "!i")
-        pid1, i = self.decode_number(cmd, i, "!i")
-        pid2, i = self.decode_number(cmd, i, "!i")
+        battleid, pid1, pid2 = cmd.decode_struct("iii")
+        if pid1 == 0 and self.battleStates is not None:
+            self.battleStates.start(battleid)
         if pid1 == 0:
-            battleconf, i = self.decode_BattleConfiguration(cmd, i)
-            teambattle, i = self.decode_TeamBattle(cmd, i)
+            battleconf = cmd.decode_BattleConfiguration()
+            teambattle = cmd.decode_TeamBattle()
             self.onEngageBattle(battleid, pid1, pid2, battleconf, teambattle)
         else:
             self.onEngageBattle(battleid, pid1, pid2, None, None)
@@ -1325,8 +1680,8 @@ class POClient(POEncoder):
         """
 
     def on_BattleMessage(self, cmd):
-        battleid, i = self.decode_number(cmd, 0, "!i")
-        b, i = self.decode_bytes(cmd, i)
+        battleid = cmd.decode_number("i")
+        b = cmd.decode_bytes()
         self.handleBattleCommand(battleid, b)
         self.onBattleMessage(battleid, b)
 
@@ -1336,15 +1691,21 @@ class POClient(POEncoder):
         It is recommended to use onBattle* functions which will parse
         the rest of the battle message event too
         battleid : int - the id of the battle
-        bytes : bytes - rest of event
+        bytes : bytes - rest of event, a memoryview in zerocopy mode
         """
 
     def on_BattleFinished(self, cmd):
-        battleid, i = self.decode_number(cmd, 0, "!i")
-        result, i = self.decode_number(cmd, i, "!B")
-        winner, i = self.decode_number(cmd, i, "!i")
-        loser, i = self.decode_number(cmd, i, "!i")
+        battleid = cmd.decode_number("i")
+        result = cmd.decode_number("B")
+        winner = cmd.decode_number("i")
+        loser = cmd.decode_number("i")
         outcome = BattleResult[result]
+        if self.world is not None:
+            self.world.finishBattle(battleid)
+        if self.battleStates is not None:
+            self.battleStates.remove(battleid)
+        if self.spectators is not None:
+            self.spectators.finish(battleid)
         self.onBattleFinished(battleid, outcome, winner, loser)
 
     def onBattleFinished(self, battleid, outcome, winner, loser):
@@ -1358,25 +1719,30 @@ class POClient(POEncoder):
       
     ### Channel related events
 
+    # Give integer lists (ChannelPlayers) to the handlers as arrays,
+    # see PODecoder.decode_numbers
+    intArrays = False
+
     def on_ChannelPlayers(self, cmd):
-        chanid, i = self.decode_number(cmd, 0, "!i")
-        numitems, i = self.decode_number(cmd, i, "!I")
-        playerlist = []
-        for k in xrange(numitems):
-            playerid, i = self.decode_number(cmd, i, "!i")
-            playerlist.append(playerid)
+        chanid, numitems = cmd.decode_struct("iI")
+        playerlist = cmd.decode_numbers("i", numitems, self.intArrays)
+        if self.world is not None:
+            self.world.setChannelPlayers(chanid, playerlist)
         self.onChannelPlayers(chanid, playerlist)
     
     def onChannelPlayers(self, chanid, playerlist):
         """
         Event telling us the players of a channel
         chanid : int - the id of the channel
-        playerlist : list of ints - contains the ids of the players
+        playerlist : list of ints - contains the ids of the players,
+                     an array if intArrays is set
         """
 
     def on_JoinChannel(self, cmd):
-        chanid, i = self.decode_number(cmd, 0, "!i")
-        playerid, i = self.decode_number(cmd, i, "!i")
+        chanid = cmd.decode_number("i")
+        playerid = cmd.decode_number("i")
+        if self.world is not None:
+            self.world.join(chanid, playerid)
         self.onJoinChannel(chanid, playerid) 
 
     def onJoinChannel(self, chanid, playerid):
@@ -1387,8 +1753,10 @@ class POClient(POEncoder):
         """
 
     def on_LeaveChannel(self, cmd):
-        chanid, i = self.decode_number(cmd, 0, "!i")
-        playerid, i = self.decode_number(cmd, i, "!i")
+        chanid = cmd.decode_number("i")
+        playerid = cmd.decode_number("i")
+        if self.world is not None:
+            self.world.leave(chanid, playerid)
         self.onLeaveChannel(chanid, playerid)
 
     def onLeaveChannel(self, chanid, playerid):
@@ -1399,10 +1767,14 @@ class POClient(POEncoder):
         """
 
     def on_ChannelBattle(self, cmd):
-        chanid, i = self.decode_number(cmd, 0, "!i")
-        battleid, i = self.decode_number(cmd, 0, "!i")
-        player1, i = self.decode_number(cmd, i, "!i")
-        player2, i = self.decode_number(cmd, i, "!i")
+        chanid = cmd.decode_number("i")
+        battleid = cmd.decode_number("i")
+        player1 = cmd.decode_number("i")
+        player2 = cmd.decode_number("i")
+        if self.world is not None:
+            self.world.addBattle(chanid, battleid, player1, player2)
+        if self.spectators is not None:
+            self.spectators.offer(chanid, battleid, player1, player2)
         self.onChannelBattle(chanid, battleid, player1, player2)
 
     def onChannelBattle(self, chanid, battleid, player1, player2):
@@ -1417,13 +1789,16 @@ class POClient(POEncoder):
         """
 
     def on_ChannelMessage(self, cmd):
-        chanid, i = self.decode_number(cmd, 0, "!i")
-        message, i = self.decode_string(cmd, i)
+        chanid = cmd.decode_number("i")
+        message = cmd.decode_string()
         splitted = message.split(":", 1)
         if len(splitted) == 2:
             user = splitted[0]
             msg = splitted[1].lstrip()
             self.onChannelMessage(chanid, user, msg)
+            if self.world is not None:
+                # the packet only carries the name, like SendMessage
+                self.onChannelMessageFrom(chanid, self.world.names.get(user, 0), user, msg)
         else:
             self.onChannelMessage(chanid, "", message)
 
@@ -1435,8 +1810,17 @@ class POClient(POEncoder):
         message : unicode - the message
         """
 
+    def onChannelMessageFrom(self, chanid, playerid, user, message):
+        """
+        Event following onChannelMessage when world is kept, with the
+        author resolved through world.names
+        playerid : int - the id of the user, 0 if the name is unknown
+        """
+
     def on_RemoveChannel(self, cmd):
-        chanid, i = self.decode_number(cmd, 0, "!i")
+        chanid = cmd.decode_number("i")
+        if self.world is not None:
+            self.world.removeChannel(chanid)
         self.onRemoveChannel(chanid)
 
     def onRemoveChannel(self, chanid):
@@ -1446,8 +1830,10 @@ class POClient(POEncoder):
         """
 
     def on_AddChannel(self, cmd):
-        channame, i = self.decode_string(cmd, 0)
-        chanid, i = self.decode_number(cmd, i, "!i")
+        channame = cmd.decode_string()
+        chanid = cmd.decode_number("i")
+        if self.world is not None:
+            self.world.addChannel(chanid, channame)
         self.onAddChannel(chanid, channame)
 
     def onAddChannel(self, chanid, channame):
@@ -1458,8 +1844,8 @@ class POClient(POEncoder):
         """
 
     def on_HtmlChannel(self, cmd):
-        chanid, i = self.decode_number(cmd, 0, "!i")
-        message, i = self.decode_string(cmd, i)
+        chanid = cmd.decode_number("i")
+        message = cmd.decode_string()
         self.onHtmlChannel(chanid, message)
         
     def onHtmlChannel(self, chanid, message):
@@ -1470,8 +1856,8 @@ class POClient(POEncoder):
     ### Global events
 
     def on_SendPM(self, cmd):
-        playerid, i = self.decode_number(cmd, 0, "!i")
-        message, i = self.decode_string(cmd, i) 
+        playerid = cmd.decode_number("i")
+        message = cmd.decode_string()
         self.onSendPM(playerid, message)
 
     def onSendPM(self, playerid, message):
@@ -1482,8 +1868,10 @@ class POClient(POEncoder):
         """
 
     def on_Away(self, cmd):
-        playerid, i = self.decode_number(cmd, 0, "!i")
-        status, i = self.decode_number(cmd, i, "B")
+        playerid = cmd.decode_number("i")
+        status = cmd.decode_number("B")
+        if self.playerTable is not None:
+            self.playerTable.setAway(playerid, status>0)
         self.onAway(playerid, status>0)
 
     def onAway(self, playerid, isAway):
@@ -1494,25 +1882,32 @@ class POClient(POEncoder):
         """
 
     def on_SendMessage(self, cmd):
-        network_flags, i = self.decode_number(cmd, 0, "B") 
+        network_flags = cmd.decode_number("B")
         hasChannel = network_flags & 1 > 0
         hasId = network_flags & 2 > 0
-        data_flags, i = self.decode_number(cmd, i, "B") 
+        data_flags = cmd.decode_number("B")
         isHtml = data_flags & 1 > 0
         kwargs = {'isHtml': isHtml, 'hasChannel': hasChannel, 'hasId': hasId}
         if hasChannel: # hasChannel:
-            channel, i = self.decode_number(cmd, i, "!I")
+            channel = cmd.decode_number("I")
             kwargs['channel'] = channel
         if hasId: # hasId:
-            id, i = self.decode_number(cmd, i, "!I")
+            id = cmd.decode_number("I")
             kwargs['id'] = id
-        message, i = self.decode_string(cmd, i)
+        message = cmd.decode_string()
 
         if not hasId:
             splitted = message.split(":", 1)
             if len(splitted) == 2:
                 kwargs['user'] = splitted[0]
                 message = splitted[1].lstrip()
+                if self.world is not None:
+                    # the author is known by name only, hasId tells
+                    # whether world.names resolved it
+                    id = self.world.names.get(splitted[0], 0)
+                    if id:
+                        kwargs['id'] = id
+                        kwargs['hasId'] = True
             else:
                 kwargs['user'] = ""
                 
@@ -1558,6 +1953,7 @@ NetworkEvents = {
         'SpectateBattle': 27,
         'SpectatingBattleMessage': 28,
         'SpectatingBattleChat': 29,
+        'SpectatingBattleFinished': 30,
         'VersionControl': 33,
         'TierSelection': 34,
         'ServMaxChange': 35,
@@ -1574,7 +1970,9 @@ NetworkEvents = {
         'ChannelBattle': 48,
         'RemoveChannel': 49,
         'AddChannel': 50,
+        'ChannelMessage': 51,
         'ChanNameChange': 52,
+        'HtmlChannel': 54,
         'ServerName': 55,
         'SpecialPass': 56,
         'ServerListEnd': 57,
@@ -1734,18 +2132,22 @@ TempPokeChange = {
 ### Structs used in Pokemon Online Protocol
 
 class Color(object):
+    __slots__ = ('color_spec', 'alpha', 'red', 'green', 'blue', 'pad')
+
     def __init__(self, color_spec=0, alpha=0, red=0, green=0, blue=0, pad=0):
-        self.color_spec = 0
-        self.alpha = 0
-        self.red = 0
-        self.green = 0
-        self.blue = 0
-        self.pad = 0
+        self.color_spec = color_spec
+        self.alpha = alpha
+        self.red = red
+        self.green = green
+        self.blue = blue
+        self.pad = pad
 
     def __repr__(self):
         return "<POProtocol.Color (spec=%d, alpha=%d, red=%d, blue=%d, green=%d, pad=%d)>" % (self.color_spec, self.alpha, self.red, self.blue, self.green, self.pad)
 
 class PlayerInfo(object):
+    __slots__ = ('id', 'name', 'info', 'auth', 'flags', 'rating', 'pokemon', 'avatar', 'tier', 'color', 'gen', 'away', 'hasLadder', 'teams', 'channels')
+
     def __init__(self):
         self.id = 0
         self.name = ""
@@ -1759,11 +2161,13 @@ class PlayerInfo(object):
         self.color = 0
         self.gen = 0
         self.away = False
+        self.hasLadder = False
+        self.teams = []
         self.channels = {}
 
     def update(self, o):
         if self.id != o.id:
-            raise "Updating with different ID!"
+            raise ValueError("Updating with different ID!")
         self.name = o.name
         self.info = o.info
         self.auth = o.auth
@@ -1775,18 +2179,109 @@ class PlayerInfo(object):
         self.color = o.color
         self.gen = o.gen
         self.away = o.away
+        self.hasLadder = o.hasLadder
+        self.teams = o.teams
+
+    def colorFields(self):
+        """
+        (color_spec, alpha, red, green, blue) of the name color, zeros
+        when there is none, e.g. Color is in skippedStructures
+        """
+        color = self.color
+        if not isinstance(color, Color):
+            return (0, 0, 0, 0, 0)
+        return (color.color_spec, color.alpha, color.red, color.green, color.blue)
 
     def __repr__(self):
         return "<POProtocol.PlayerInfo (id=%d, name=%r)>" % (self.id, self.name)
 
+class LazyPlayerInfo(PlayerInfo):
+    """
+    PlayerInfo which keeps the bytes of the struct and decodes
+    color, info and teams only when one of them is first accessed,
+    skipping the structs in skip like the decoder which made it.
+    Until then it holds a reference to the whole PlayersList frame:
+    while any player of the frame is kept, e.g. in a World, the frame
+    stays in memory. Call materialize() on players kept for long.
+    """
+    __slots__ = ('_cmd', '_offset', '_colorOffset', '_skip')
+
+    lazy = ('color', 'info', 'teams')
+
+    def __init__(self, cmd, offset, skip=()):
+        self.id = 0
+        self.name = ""
+        self.auth = 0
+        self.flags = 0
+        self.rating = 0
+        self.pokemon = [0]*6
+        self.avatar = 0
+        self.tier = ""
+        self.gen = 0
+        self.away = False
+        self.hasLadder = False
+        self.channels = {}
+        # the version_controlled header of the struct starts at offset
+        self._cmd = cmd
+        self._offset = offset
+        self._skip = skip
+
+    def __getattr__(self, name):
+        # only called for attributes not set yet
+        if name not in self.lazy or self._cmd is None:
+            raise AttributeError(name)
+        self.materialize()
+        return getattr(self, name)
+
+    def update(self, o):
+        PlayerInfo.update(self, o)
+        # every lazy field was just set, the frame would only be stale
+        self._cmd = None
+
+    def materialize(self):
+        """ Decodes the lazy fields now and drops the reference to the frame """
+        if self._cmd is None:
+            return
+        decoder = PODecoder(self._cmd, self._skip)
+        decoder.i = self._offset
+        full = decoder.decode_PlayerInfo()
+        self.color = full.color
+        self.info = full.info
+        self.teams = full.teams
+        self._cmd = None
+
+    def colorFields(self):
+        if self._cmd is None:
+            return PlayerInfo.colorFields(self)
+        # Color is fixed width, read in place without decoding the rest
+        if len(self._cmd) < self._colorOffset + ColorSchema.size:
+            return (0, 0, 0, 0, 0)
+        return _colorStruct.unpack_from(self._cmd, self._colorOffset)[:5]
+
 class FullInfo(object):
+    __slots__ = ('team', 'ladder', 'showteam', 'nameColor')
+
     def __init__(self):
         self.team = 0 # TrainerTeam
         self.ladder = False # Bool
         self.showteam = False # Bool
         self.nameColor = 0 # Color
 
+class TrainerInfo(object):
+    __slots__ = ('avatar', 'info', 'lose', 'win', 'tie')
+
+    def __init__(self):
+        self.avatar = 0
+        self.info = ""
+        self.lose = ""
+        self.win = ""
+        self.tie = ""
+    def __repr__(self):
+        return "<POProtocol.TrainerInfo (avatar=%d, info=%r)>" % (self.avatar, self.info)
+
 class TrainerTeam(object):
+    __slots__ = ('nick', 'info', 'lose', 'win', 'avatar', 'defaultTier', 'team')
+
     def __init__(self):
         self.nick = ""
         self.info = ""
@@ -1799,8 +2294,11 @@ class TrainerTeam(object):
         return "<POProtocol.TrainerTeam (nick=%r, team=%r)>" % (self.nick, self.team)
 
 class Team(object):
+    __slots__ = ('gen', 'defaultTier', 'poke')
+
     def __init__(self):
         self.gen = 0
+        self.defaultTier = ""
         self.poke = [0]*6
         for k in xrange(6):
             self.poke[k] = PokePersonal() 
@@ -1808,14 +2306,20 @@ class Team(object):
         return "<POProtocol.Team (gen=%d, team=%r)>" % (self.gen, self.poke)
 
 class PokePersonal(object):
+    __slots__ = ('gen', 'uniqueid', 'nickname', 'ball', 'item', 'ability', 'nature', 'gender', 'shiny', 'happiness', 'ppups', 'level', 'move', 'dv', 'ev')
+
     def __init__(self):
+        self.gen = 5
         self.uniqueid = PokeUniqueId()
         self.nickname = ""
+        self.ball = 0
         self.item = 0
+        self.ability = 0
         self.nature = 0
         self.gender = 0
         self.shiny = 0
         self.happiness = 0
+        self.ppups = 0
         self.level = 0
         self.move = [0]*4
         self.dv = [0]*6
@@ -1824,6 +2328,8 @@ class PokePersonal(object):
         return "<POProtocol.PokePersonal (uniqueid=%r, nickname=%s)>" % (self.uniqueid, self.nickname)
 
 class PokeUniqueId(object):
+    __slots__ = ('pokenum', 'subnum')
+
     def __init__(self, pokenum=0, subnum=0):
         self.pokenum = pokenum
         self.subnum = subnum
@@ -1831,36 +2337,50 @@ class PokeUniqueId(object):
         return "<POProtocol.PokeUniquiId (pokenum=%d, subnum=%d)>" % (self.pokenum, self.subnum)
 
 class ChallengeInfo(object):
+    __slots__ = ('dsc', 'opp', 'clauses', 'mode', 'team', 'gen', 'srctier', 'desttier')
+
     def __init__(self, dsc = 0, opp = 0, clauses = 0, mode = 0):
         self.dsc = dsc
         self.opp = opp
         self.clauses = clauses
         self.mode = mode
+        self.team = 0
+        self.gen = 0
+        self.srctier = ""
+        self.desttier = ""
     def __repr__(self):
         return "<POProtocol.ChallengeInfo (dsc=%d, opp=%d, clauses=%d, mode=%d)>" % (self.dsc, self.opp, self.clauses, self.mode)
 
 class BattleConfiguration(object):
+    __slots__ = ('gen', 'mode', 'id', 'clauses', 'isRated')
+
     def __init__(self):
         self.gen = 0
         self.mode = 0
         self.id = [0, 0]
         self.clauses = 0
+        self.isRated = False
     def __repr__(self):
         return "<POProtocol.BattleConfiguration (gen=%d, mode=%d, id=%r, clauses=%d)>" % (self.gen, self.mode, self.id, self.clauses)
 
 class TeamBattle(object):
+    __slots__ = ('m_pokemons',)
+
     def __init__(self):
         self.m_pokemons = [None]*6
     def __repr__(self):
         return "<POProtocol.TeamBattle (m_pokemons=%r)>" % (self.m_pokemons)
 
 class PokeBattle(object):
+    __slots__ = ('num', 'nick', 'totalLifePoints', 'lifePoints', 'gender', 'level', 'shiny', 'item', 'ability', 'happiness', 'normal_stats', 'move', 'evs', 'dvs')
+
     def __init__(self):
         self.num = PokeUniqueId()
         self.nick = ""
         self.totalLifePoints = 0
         self.lifePoints = 0
         self.gender = 0
+        self.level = 0
         self.shiny = False
         self.item = 0
         self.ability = 0
@@ -1873,12 +2393,16 @@ class PokeBattle(object):
         return "<POProtocol.PokeBattle (num=%r, nick=%r)>" % (self.num, self.nick)
 
 class ShallowShownTeam(object):
+    __slots__ = ('pokes',)
+
     def __init__(self):
         self.pokes = [None]*6
     def __repr__(self):
         return "<POProtocol.ShallowShownTeam>"
 
 class ShallowShownPoke(object):
+    __slots__ = ('item', 'num', 'level', 'gender')
+
     def __init__(self):
         self.item = False
         self.num = PokeUniqueId()
@@ -1886,26 +2410,44 @@ class ShallowShownPoke(object):
         self.gender = 0
 
 class BattleChoice(object):
+    __slots__ = ('slot', 'type', 'pokeSlot', 'attackSlot', 'attackTarget', 'pokeIndices')
+
+    CancelType = 0
+    AttackType = 1
+    SwitchType = 2
+    RearrangeType = 3
+    CenterMoveType = 4
+    DrawType = 5
+
     def __init__(self):
         self.slot = 0
         self.type = 0
+        self.pokeSlot = 0
+        self.attackSlot = 0
+        self.attackTarget = 0
+        self.pokeIndices = [0]*6
 
     def __repr__(self):
         return "<POProtocol.BattleChoice (type=%r, slot=%r)>" % (self.type, self.slot)
 
 class BattleMove(object):
-    def __init__(self):
-        self.num = 0
-        self.PP = 0
-        self.totalPP = 0
+    __slots__ = ('num', 'PP', 'totalPP')
+
+    def __init__(self, num=0, PP=0, totalPP=0):
+        self.num = num
+        self.PP = PP
+        self.totalPP = totalPP
     def __repr__(self):
         return "<POProtocol.BattleMove (num=%d, PP=%d, totalPP=%d)>" % (self.num, self.PP, self.totalPP)
 
 class BattleStats(object):
+    __slots__ = ('stats',)
+
     def __init__(self):
         self.stats = [0]*6
 
 class BattleDynamicInfo(object):
+    __slots__ = ('boosts', 'flags')
 
     def __init__(self):
         self.boosts = [0]*7
@@ -1924,6 +2466,8 @@ class BattleDynamicInfo(object):
 
 
 class ShallowBattlePoke(object):
+    __slots__ = ('num', 'nick', 'lifePercent', 'fullStatus', 'level', 'gender', 'shiny')
+
     def __init__(self):
         self.num = PokeUniqueId()
         self.nick = ""
@@ -1934,6 +2478,8 @@ class ShallowBattlePoke(object):
         self.shiny = False
 
 class Channel(object):
+    __slots__ = ('id', 'name', 'players')
+
     def __init__(self, chanid, channame):
         self.id = chanid
         self.name = channame
@@ -1942,6 +2488,8 @@ class Channel(object):
         return "<POProtocol.Channel (id=%d, name=%r, playercount=%d)>" % (self.id, self.name.encode('utf-8'), len(self.players))
 
 class Battle(object):
+    __slots__ = ('id', 'enemy', 'conf', 'team')
+
     def __init__(self, battleid, enemyid, battleconf, myteam):
         self.id = battleid
         self.enemy = enemyid
@@ -1950,3 +2498,153 @@ class Battle(object):
 
     def __repr__(self):
         return "<POProtocol.Battle (id=%d, enemy=%d, team=%r)>" % (self.id, self.enemy, self.team)
+
+### Wire schemas of the structs, see schema.py
+
+ColorSchema = Schema('Color', Color, [
+    Field('color_spec', 'b'),
+    Field('alpha', 'H'),
+    Field('red', 'H'),
+    Field('green', 'H'),
+    Field('blue', 'H'),
+    Field('pad', 'H')])
+
+_colorStruct = get_struct("bHHHHH")
+
+PokeUniqueIdSchema = Schema('PokeUniqueId', PokeUniqueId, [
+    Field('pokenum', 'H'),
+    Field('subnum', 'B')])
+
+TierRatingSchema = Schema('TierRating', dict, [
+    String('tier'),
+    Field('rating', 'h')])
+
+PlayerInfoSchema = Schema('PlayerInfo', PlayerInfo, version=0, fields=[
+    Field('id', 'i'),
+    Flags('_network'),
+    Flags('_data', away=0, hasLadder=1),
+    String('name'),
+    Nested('color', ColorSchema),
+    Field('avatar', 'H'),
+    String('info'),
+    Field('auth', 'b'),
+    List('teams', TierRatingSchema, length='B')])
+
+TrainerInfoSchema = Schema('TrainerInfo', TrainerInfo, version=0, fields=[
+    Flags('_network', _hasBattleMessages=0),
+    Field('avatar', 'H'),
+    String('info'),
+    If('_hasBattleMessages', [
+        String('lose'),
+        String('win'),
+        String('tie')])])
+
+PokePersonalSchema = Schema('PokePersonal', PokePersonal, version=0, args="gen=5", fields=[
+    Flags('_network', _hasGen=0, _hasNickname=1, _hasPokeball=2, _hasHappiness=3, _hasPPups=4, _hasIVs=5),
+    If('_hasGen', [Field('gen', 'B')], otherwise=[Let('gen', 'gen')]),
+    Nested('uniqueid', PokeUniqueIdSchema),
+    Field('level', 'B'),
+    Flags('_data', shiny=0),
+    If('_hasNickname', [String('nickname')]),
+    If('_hasPokeball', [Field('ball', 'H')]),
+    If('o.gen >= 2', [
+        Field('item', 'H'),
+        If('o.gen >= 3', [
+            Field('ability', 'H'),
+            Field('nature', 'B')]),
+        Field('gender', 'B'),
+        If('_hasHappiness', [Field('happiness', 'B')])]),
+    If('_hasPPups', [Field('ppups', 'B')]),
+    Field('move', '4I'),
+    Field('dv', '6B'),
+    If('_hasIVs', [Field('ev', '6B')], otherwise=[Let('ev', '[31]*6')])])
+
+TeamSchema = Schema('Team', Team, version=0, fields=[
+    Flags('_network', _hasDefaultTier=0, _hasNumberOfPokemon=1),
+    If('_hasDefaultTier', [String('defaultTier')]),
+    Field('gen', 'B'),
+    If('_hasNumberOfPokemon', [Field('_pokes', 'B')], otherwise=[Let('_pokes', '6')]),
+    List('poke', PokePersonalSchema, count='_pokes', args='o.gen')])
+
+ChallengeInfoSchema = Schema('ChallengeInfo', ChallengeInfo, [
+    Field('dsc', 'b'),
+    Field('opp', 'i'),
+    Field('clauses', 'I'),
+    Field('mode', 'B'),
+    Field('team', 'B'),
+    Field('gen', 'B'),
+    String('srctier'),
+    String('desttier')])
+
+BattleConfigurationSchema = Schema('BattleConfiguration', BattleConfiguration, [
+    Flags('_network', _hasNumberOfIds=0),
+    Flags('_data', isRated=0),
+    Field('gen', 'B'),
+    Field('mode', 'B'),
+    Field('clauses', 'I'),
+    If('_hasNumberOfIds', [Field('_ids', 'B')], otherwise=[Let('_ids', '2')]),
+    List('id', 'i', count='_ids')])
+
+BattleMoveSchema = Schema('BattleMove', BattleMove, [
+    Field('num', 'H'),
+    Field('PP', 'B'),
+    Field('totalPP', 'B')])
+
+PokeBattleSchema = Schema('PokeBattle', PokeBattle, version=0, fields=[
+    Nested('num', PokeUniqueIdSchema),
+    Flags('_data', shiny=0),
+    String('nick'),
+    Field('totalLifePoints', 'H'),
+    Field('lifePoints', 'H'),
+    Field('gender', 'B'),
+    Field('level', 'B'),
+    Field('item', 'H'),
+    Field('ability', 'H'),
+    Field('happiness', 'B'),
+    Field('normal_stats', '5H'),
+    List('move', BattleMoveSchema, count='4'),
+    Field('evs', '6B'),
+    Field('dvs', '6B')])
+
+TeamBattleSchema = Schema('TeamBattle', TeamBattle, [
+    List('m_pokemons', PokeBattleSchema, count='6')])
+
+ShallowShownPokeSchema = Schema('ShallowShownPoke', ShallowShownPoke, [
+    Nested('num', PokeUniqueIdSchema),
+    Field('level', 'B'),
+    Field('gender', 'B'),
+    Field('_item', 'B'),
+    Let('item', '_item > 0')])
+
+ShallowShownTeamSchema = Schema('ShallowShownTeam', ShallowShownTeam, [
+    List('pokes', ShallowShownPokeSchema, count='6')])
+
+BattleStatsSchema = Schema('BattleStats', BattleStats, [
+    Field('stats', '5h')])
+
+BattleDynamicInfoSchema = Schema('BattleDynamicInfo', BattleDynamicInfo, [
+    Field('boosts', '7b'),
+    Field('flags', 'B')])
+
+ShallowBattlePokeSchema = Schema('ShallowBattlePoke', ShallowBattlePoke, [
+    Nested('num', PokeUniqueIdSchema),
+    String('nick'),
+    Field('lifePercent', 'B'),
+    Field('fullStatus', 'I'),
+    Field('gender', 'B'),
+    Field('_shiny', 'B'),
+    Field('level', 'B'),
+    Let('shiny', '_shiny > 0')])
+
+for _schema in (ColorSchema, PokeUniqueIdSchema, TierRatingSchema, PlayerInfoSchema,
+                TrainerInfoSchema, PokePersonalSchema, TeamSchema,
+                ChallengeInfoSchema, BattleConfigurationSchema,
+                BattleMoveSchema, PokeBattleSchema, TeamBattleSchema,
+                ShallowShownPokeSchema, ShallowShownTeamSchema,
+                BattleStatsSchema, BattleDynamicInfoSchema,
+                ShallowBattlePokeSchema):
+    setattr(PODecoder, "decode_%s" % _schema.name, _schema.compile())
+    setattr(PODecoder, "skip_%s" % _schema.name, _schema.compile_skip())
+PODecoder.decode_color = PODecoder.decode_Color
+PODecoder.decode_pokeid = PODecoder.decode_PokeUniqueId
+PODecoder.skip_LazyPlayerInfo = PODecoder.skip_PlayerInfo
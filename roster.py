@@ -0,0 +1,139 @@
+# roster.py
+# Columnar store of the players on a Pokemon Online server
+#
+# Licensed under BSD-style license.
+# See LICENSE for details
+
+"""
+PlayerTable keeps the roster as columns instead of PlayerInfo objects:
+one array per numeric attribute, a list of names and an id -> row index.
+Queries build masks over whole columns, with numpy when it is installed,
+otherwise with itertools over the arrays.
+
+    table = PlayerTable()
+    table.select(table.awayMask(), table.authMask(1))  # ids of away mods
+"""
+
+import array
+import operator
+from itertools import compress, imap, repeat
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class PlayerTable(object):
+
+    # column name -> array typecode, matching the wire formats of PlayerInfo and Color
+    columns = (
+        ('ids', 'i'),
+        ('auth', 'b'),
+        ('away', 'B'),
+        ('avatar', 'H'),
+        ('colorSpec', 'b'),
+        ('alpha', 'H'),
+        ('red', 'H'),
+        ('green', 'H'),
+        ('blue', 'H'))
+
+    def __init__(self):
+        for name, typecode in self.columns:
+            setattr(self, name, array.array(typecode))
+        self.names = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, playerid):
+        return playerid in self.index
+
+    def row(self, playerid):
+        """ Row of the player, KeyError if not in the table """
+        return self.index[playerid]
+
+    def update(self, player):
+        """ Adds the PlayerInfo player or overwrites its row """
+        row = self.index.get(player.id)
+        # colorFields reads the color of a LazyPlayerInfo in place
+        values = (player.id, player.auth, 1 if player.away else 0, player.avatar) + player.colorFields()
+        if row is None:
+            self.index[player.id] = len(self.ids)
+            for (name, typecode), value in zip(self.columns, values):
+                getattr(self, name).append(value)
+            self.names.append(player.name)
+        else:
+            for (name, typecode), value in zip(self.columns, values):
+                getattr(self, name)[row] = value
+            self.names[row] = player.name
+
+    def extend(self, players):
+        for player in players:
+            self.update(player)
+
+    def remove(self, playerid):
+        """ Removes the player, moving the last row into its place """
+        row = self.index.pop(playerid, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1
+        if row != last:
+            for name, typecode in self.columns:
+                column = getattr(self, name)
+                column[row] = column[last]
+            self.names[row] = self.names[last]
+            self.index[self.ids[row]] = row
+        for name, typecode in self.columns:
+            getattr(self, name).pop()
+        self.names.pop()
+
+    def setAway(self, playerid, away):
+        row = self.index.get(playerid)
+        if row is not None:
+            self.away[row] = 1 if away else 0
+
+    def name(self, playerid):
+        return self.names[self.index[playerid]]
+
+    #### QUERIES
+
+    def column(self, name):
+        """ A copy of the column, as a numpy array or as an array without numpy """
+        column = getattr(self, name)
+        if numpy is None or not column:
+            return column[:]
+        return self.view(name).copy()
+
+    def view(self, name):
+        """
+        The column as a numpy array sharing its memory. Only valid until
+        the table changes: a growing array moves its memory elsewhere.
+        """
+        column = getattr(self, name)
+        return numpy.frombuffer(column, dtype=column.typecode)
+
+    def authMask(self, level):
+        """ Rows of players with auth >= level """
+        if numpy is None or not self.ids:
+            return array.array('B', imap(operator.le, repeat(level), self.auth))
+        return self.view('auth') >= level
+
+    def awayMask(self, away=True):
+        if numpy is None or not self.ids:
+            if away:
+                return self.away[:]
+            return array.array('B', imap(operator.not_, self.away))
+        return self.view('away') == (1 if away else 0)
+
+    def select(self, *masks):
+        """ Ids of the players in all the masks """
+        if numpy is None or not self.ids:
+            mask = masks[0]
+            for other in masks[1:]:
+                mask = imap(operator.and_, mask, other)
+            return list(compress(self.ids, mask))
+        mask = masks[0]
+        for other in masks[1:]:
+            mask = mask & other
+        return self.view('ids')[mask].tolist()
@@ -0,0 +1,277 @@
+# schema.py
+# Declarative wire schemas for the structs of Pokemon Online protocol
+#
+# Licensed under BSD-style license.
+# See LICENSE for details
+
+"""
+A Schema lists the fields of a protocol struct in wire order.
+Schema.compile() generates, once, a decode function specialized for that
+struct: consecutive fixed width fields are read with a single
+Struct.unpack_from, flags and conditions become plain if statements.
+
+Field names starting with an underscore are local to the decode function
+(network flags, counts), all other names are set on the decoded object.
+Conditions are python expressions over those locals and the object `o`.
+
+A class whose __slots__ name all the fields of a fixed width schema, in
+wire order, is built directly from the unpacked tuple with cls(*values).
+
+Schema.compile_skip() gives the matching skip function, which moves past a
+struct without decoding it: in O(1) when the struct is version_controlled
+or fixed width.
+"""
+
+import struct
+
+class Field(object):
+    """ Fixed width field, fmt is a struct format like "H" or "6B" (a list) """
+
+    def __init__(self, name, fmt):
+        self.name = name
+        self.fmt = fmt
+        self.count = int(fmt[:-1]) if len(fmt) > 1 else None
+
+class String(object):
+    """ Length prefixed utf-8 string """
+
+    def __init__(self, name):
+        self.name = name
+
+class Bytes(object):
+    """ Length prefixed raw bytes """
+
+    def __init__(self, name):
+        self.name = name
+
+class Flags(object):
+    """
+    Variable length flags, bits maps names to bit numbers.
+    Flags(_network, _hasGen=0) sets the local _hasGen to bool(flags & 1)
+    """
+
+    def __init__(self, name, **bits):
+        self.name = name
+        self.bits = sorted(bits.items(), key=lambda item: item[1])
+
+class Nested(object):
+    """ A struct described by another schema """
+
+    def __init__(self, name, schema, args=""):
+        self.name = name
+        self.schema = schema
+        self.args = args
+
+class List(object):
+    """
+    A list of items, item is either a schema or a struct format.
+    Exactly one of length (struct format of the count on the wire)
+    and count (python expression) must be given.
+    """
+
+    def __init__(self, name, item, length=None, count=None, args=""):
+        assert (length is None) != (count is None)
+        self.name = name
+        self.item = item
+        self.length = length
+        self.count = count
+        self.args = args
+
+class If(object):
+    """ Fields only present when cond holds, otherwise are used if not """
+
+    def __init__(self, cond, fields, otherwise=()):
+        self.cond = cond
+        self.fields = fields
+        self.otherwise = otherwise
+
+class Let(object):
+    """ Sets name to the value of expr without reading anything """
+
+    def __init__(self, name, expr):
+        self.name = name
+        self.expr = expr
+
+def version_mismatch(name, version, structure_version):
+    print("Warning: we have a different version ({}) of {} ({}) than server".format(version, name, structure_version))
+
+class Schema(object):
+    """
+    name : str - the decoder becomes PODecoder.decode_<name>
+    cls : class - instantiated without arguments for every decoded struct
+    fields : list - the fields in wire order
+    version : int - the struct is version_controlled with this version
+    args : str - additional arguments of the decode function
+    """
+
+    def __init__(self, name, cls, fields, version=None, args=""):
+        self.name = name
+        self.cls = cls
+        self.fields = fields
+        self.version = version
+        self.args = args
+        self._decoder = None
+        self._skipper = None
+
+    @property
+    def size(self):
+        """ Size on the wire when all fields are fixed width, else None """
+        if self.version is not None or not all(isinstance(field, Field) for field in self.fields):
+            return None
+        return struct.calcsize("!" + "".join(field.fmt for field in self.fields))
+
+    def compile(self):
+        if self._decoder is None:
+            self._decoder = _SchemaCompiler(self).compile()
+        return self._decoder
+
+    def compile_skip(self):
+        if self._skipper is None:
+            self._skipper = self._make_skip()
+        return self._skipper
+
+    def _make_skip(self):
+        size = self.size
+        if self.version is not None:
+            def skip(d, *args):
+                l = d.decode_number("H")
+                d.i += l
+        elif size is not None:
+            def skip(d, *args):
+                d.i += size
+        else:
+            decode = self.compile()
+            def skip(d, *args):
+                decode(d, *args)
+        skip.__name__ = "skip_%s" % self.name
+        return skip
+
+class _SchemaCompiler(object):
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.lines = []
+        self.namespace = {'cls': schema.cls, 'version_mismatch': version_mismatch}
+
+    def compile(self):
+        schema = self.schema
+        funcname = "decode_%s" % schema.name
+        self.emit(0, "def %s(d%s):" % (funcname, ", " + schema.args if schema.args else ""))
+        if schema.version is not None:
+            self.emit(1, '_end = d.decode_number("H")')
+            self.emit(1, "_end += d.i")
+            self.emit(1, '_version = d.decode_number("B")')
+            self.emit(1, "if _version != %d:" % schema.version)
+            self.emit(2, "version_mismatch(%r, %d, _version)" % (schema.name, schema.version))
+        if self.positional():
+            self.unpack(1, schema.fields)
+            self.emit(1, "o = cls(*_t)")
+        else:
+            self.emit(1, "o = {}" if schema.cls is dict else "o = cls()")
+            self.block(1, schema.fields)
+        if schema.version is not None:
+            self.emit(1, "d.i = _end")
+        self.emit(1, "return o")
+        source = "\n".join(self.lines) + "\n"
+        exec compile(source, "<schema %s>" % schema.name, "exec") in self.namespace
+        decoder = self.namespace[funcname]
+        decoder.source = source
+        return decoder
+
+    def positional(self):
+        fields = self.schema.fields
+        return all(isinstance(field, Field) and field.count is None for field in fields) and \
+            getattr(self.schema.cls, "__slots__", None) == tuple(field.name for field in fields)
+
+    def emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+    def target(self, name):
+        if name.startswith("_"):
+            return name
+        if self.schema.cls is dict:
+            return "o[%r]" % name
+        return "o.%s" % name
+
+    def constant(self, value):
+        name = "_c%d" % len(self.namespace)
+        self.namespace[name] = value
+        return name
+
+    def block(self, indent, fields):
+        if not fields:
+            self.emit(indent, "pass")
+        group = []
+        for field in fields:
+            if isinstance(field, Field):
+                group.append(field)
+                continue
+            if group:
+                self.fixed(indent, group)
+                group = []
+            getattr(self, "emit_%s" % type(field).__name__)(indent, field)
+        if group:
+            self.fixed(indent, group)
+
+    def unpack(self, indent, group):
+        s = struct.Struct("!" + "".join(field.fmt for field in group))
+        st = self.constant(s)
+        zeros = self.constant(s.unpack("\0" * s.size))
+        self.emit(indent, "if len(d.cmd) >= d.i + %d:" % s.size)
+        self.emit(indent+1, "_t = %s.unpack_from(d.cmd, d.i)" % st)
+        self.emit(indent, "else:")
+        self.emit(indent+1, "_t = %s" % zeros)
+        self.emit(indent, "d.i += %d" % s.size)
+
+    def fixed(self, indent, group):
+        self.unpack(indent, group)
+        if all(field.count is None for field in group):
+            targets = [self.target(field.name) for field in group]
+            self.emit(indent, "%s = _t" % (", ".join(targets) if len(targets) > 1 else targets[0] + ","))
+            return
+        k = 0
+        for field in group:
+            if field.count is None:
+                self.emit(indent, "%s = _t[%d]" % (self.target(field.name), k))
+                k += 1
+            else:
+                self.emit(indent, "%s = list(_t[%d:%d])" % (self.target(field.name), k, k+field.count))
+                k += field.count
+
+    def emit_String(self, indent, field):
+        self.emit(indent, "%s = d.decode_string()" % self.target(field.name))
+
+    def emit_Bytes(self, indent, field):
+        self.emit(indent, "%s = d.decode_bytes()" % self.target(field.name))
+
+    def emit_Flags(self, indent, field):
+        self.emit(indent, "%s = d.decode_flags()" % field.name)
+        for name, bit in field.bits:
+            self.emit(indent, "%s = %s & %d > 0" % (self.target(name), field.name, 1 << bit))
+
+    # nested structs go through the decoder methods so that the skip
+    # policy of the decoder applies to them too
+
+    def emit_Nested(self, indent, field):
+        self.emit(indent, "%s = d.decode_%s(%s)" % (self.target(field.name), field.schema.name, field.args))
+
+    def emit_List(self, indent, field):
+        if field.length is not None:
+            count = 'd.decode_number("%s")' % field.length
+        else:
+            count = field.count
+        if isinstance(field.item, Schema):
+            item = "d.decode_%s(%s)" % (field.item.name, field.args)
+        else:
+            item = 'd.decode_number("%s")' % field.item
+        self.emit(indent, "%s = [%s for _k in xrange(%s)]" % (self.target(field.name), item, count))
+
+    def emit_If(self, indent, field):
+        self.emit(indent, "if %s:" % field.cond)
+        self.block(indent+1, field.fields)
+        if field.otherwise:
+            self.emit(indent, "else:")
+            self.block(indent+1, field.otherwise)
+
+    def emit_Let(self, indent, field):
+        self.emit(indent, "%s = %s" % (self.target(field.name), field.expr))
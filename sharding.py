@@ -0,0 +1,140 @@
+# sharding.py
+# Parsing battle commands in worker processes
+#
+# Licensed under BSD-style license.
+# See LICENSE for details
+
+"""
+BattleShards parses the battle commands of a POClient in worker
+processes. A battle always goes to the same worker, battleid % workers,
+and every worker handles its commands in order, so the commands of a
+battle come back in the order they were received.
+
+Commands are sent to the workers in batches of batchSize, or when
+flush() is called, and the parsed commands come back one batch per
+batch sent. poll() calls POClient.battleEvent for them in the main
+process. Commands whose parser raised are reported to
+POClient.onBattleParseError instead, and the last maxErrors of them are
+kept in errors as (battleid, payload, exception repr):
+
+    client.battleShards = BattleShards(client.__class__)
+    client.battleShards.start()
+    ...
+    client.battleShards.poll(client)   # e.g. from a timer of the event loop
+"""
+
+import multiprocessing
+from Queue import Empty
+from collections import deque
+
+from protocol import PODecoder, battleCommandTable
+
+def _work(cls, inbox, outbox):
+    # the parsers do not use the client, an instance without state does
+    client = cls.__new__(cls)
+    table = battleCommandTable(cls)
+    while True:
+        batch = inbox.get()
+        if batch is None:
+            break
+        events = []
+        errors = []
+        for battleid, payload in batch:
+            try:
+                cmd = PODecoder(payload)
+                msgnro = cmd.decode_number("B")
+                spot = cmd.decode_number("B")
+                args = table[msgnro][1](client, battleid, spot, cmd)
+            except Exception as e:
+                # a malformed command must not take the worker down, the
+                # batch still goes back so the parent can account for it
+                errors.append((battleid, payload, repr(e)))
+                continue
+            if args is not None:
+                events.append((battleid, spot, msgnro, args))
+        outbox.put((events, errors))
+
+class BattleShards(object):
+
+    def __init__(self, cls, workers=None, batchSize=64, maxErrors=100):
+        """
+        cls : class - the POClient subclass whose parsers are used
+        workers : int - number of worker processes, one per cpu by default
+        maxErrors : int - number of the last parse errors kept in errors
+        """
+        self.cls = cls
+        self.workers = workers or multiprocessing.cpu_count()
+        self.batchSize = batchSize
+        self.inboxes = []
+        self.outbox = None
+        self.processes = []
+        self.pending = [[] for k in xrange(self.workers)]
+        self.inflight = 0
+        self.errors = deque(maxlen=maxErrors)
+
+    def start(self):
+        self.outbox = multiprocessing.Queue()
+        for k in xrange(self.workers):
+            inbox = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_work, args=(self.cls, inbox, self.outbox))
+            process.daemon = True
+            process.start()
+            self.inboxes.append(inbox)
+            self.processes.append(process)
+
+    def submit(self, battleid, payload):
+        shard = battleid % self.workers
+        batch = self.pending[shard]
+        # memoryviews of zerocopy mode can't be pickled
+        batch.append((battleid, payload if isinstance(payload, bytes) else bytes(bytearray(payload))))
+        if len(batch) >= self.batchSize:
+            self.send(shard)
+
+    def send(self, shard):
+        self.inboxes[shard].put(self.pending[shard])
+        self.pending[shard] = []
+        self.inflight += 1
+
+    def flush(self):
+        """ Sends the commands not sent yet, whatever the size of their batch """
+        for shard in xrange(self.workers):
+            if self.pending[shard]:
+                self.send(shard)
+
+    def poll(self, client, timeout=0):
+        """
+        Sends the pending commands and calls client.battleEvent for
+        every batch parsed so far, waiting up to timeout seconds for
+        the first one, without limit if timeout is None.
+        Returns the number of commands handled.
+        """
+        self.flush()
+        handled = 0
+        while self.inflight:
+            try:
+                events, errors = self.outbox.get(True, timeout) if timeout != 0 else self.outbox.get_nowait()
+            except Empty:
+                break
+            self.inflight -= 1
+            timeout = 0
+            for battleid, spot, msgnro, args in events:
+                client.battleEvent(battleid, spot, msgnro, args)
+            handled += len(events)
+            for error in errors:
+                self.errors.append(error)
+                client.onBattleParseError(*error)
+        return handled
+
+    def join(self, client):
+        """ Waits for every command submitted to be parsed and handled """
+        self.flush()
+        while self.inflight:
+            self.poll(client, None)
+
+    def close(self):
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            process.join()
+        self.inboxes = []
+        self.processes = []
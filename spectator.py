@@ -0,0 +1,172 @@
+# spectator.py
+# Spectating many Pokemon Online battles at once
+#
+# Licensed under BSD-style license.
+# See LICENSE for details
+
+"""
+SpectatorManager spectates the battles POClient hears of from BattleList
+and ChannelBattle, up to maxBattles at once; the others wait for a free
+slot. The messages of every battle go to a queue of at most queueSize
+commands, process() hands them to POClient.handleBattleCommand.
+
+When process() falls behind and more than highWater messages are queued
+in total, no new battle is admitted until the backlog is back under
+lowWater. A battle whose queue overflows is given up, the state built
+from its messages could not be trusted anymore.
+
+The messages of battles the manager does not spectate, e.g. ones the
+application spectates itself, are left to POClient, except the late
+ones of the last battles the manager gave up.
+
+    client.spectators = SpectatorManager(client, maxBattles=300,
+                                         schedule=loop.call_soon)
+"""
+
+from collections import deque, OrderedDict
+
+class SpectatorManager(object):
+
+    def __init__(self, client, maxBattles=100, queueSize=1024,
+                 highWater=65536, lowWater=16384, schedule=None, remember=1024):
+        """
+        schedule : function - schedule(process) should arrange for
+            process() to be called later, e.g. loop.call_soon. Without
+            it messages are processed as soon as they arrive.
+        remember : int - number of the battles given up whose late
+            messages are still swallowed
+        """
+        self.client = client
+        self.maxBattles = maxBattles
+        self.queueSize = queueSize
+        self.highWater = highWater
+        self.lowWater = lowWater
+        self.schedule = schedule
+        self.queues = OrderedDict()
+        # ids of the battles with queued messages, in the order they are served
+        self.ready = deque()
+        # the ids in ready, a battle removed and admitted again while
+        # its id is still there keeps that one place
+        self.readyIds = set()
+        self.waiting = OrderedDict()
+        self.backlog = 0
+        self.admitting = True
+        self.scheduled = False
+        self.dropped = 0
+        self.finished = OrderedDict()
+        self.remember = remember
+
+    def accept(self, chanid, battleid, player1, player2):
+        """ Whether to spectate the battle, override to filter """
+        return True
+
+    def __contains__(self, battleid):
+        return battleid in self.queues
+
+    def __len__(self):
+        return len(self.queues)
+
+    #### SUBSCRIPTIONS
+
+    def offer(self, chanid, battleid, player1, player2):
+        """ A battle started, spectates it if there is room """
+        if battleid in self.queues or battleid in self.waiting:
+            return
+        if not self.accept(chanid, battleid, player1, player2):
+            return
+        self.waiting[battleid] = chanid
+        self.admit()
+
+    def admit(self):
+        while self.waiting and self.admitting and len(self.queues) < self.maxBattles:
+            battleid, chanid = self.waiting.popitem(last=False)
+            self.finished.pop(battleid, None)
+            self.queues[battleid] = deque()
+            self.client.spectateBattle(battleid)
+
+    def finish(self, battleid):
+        """ The battle is over, stops spectating it """
+        self.waiting.pop(battleid, None)
+        if battleid in self.queues:
+            self.client.spectatingBattleFinished(battleid)
+            if self.client.battleStates is not None:
+                self.client.battleStates.remove(battleid)
+            self.remove(battleid)
+            # the server sends a few more messages before it stops
+            self.finished[battleid] = True
+            if len(self.finished) > self.remember:
+                self.finished.popitem(last=False)
+
+    def remove(self, battleid):
+        """ Forgets the battle, the server stopped sending it """
+        queue = self.queues.pop(battleid, None)
+        if queue is not None:
+            self.backlog -= len(queue)
+            self.update()
+            self.admit()
+
+    def update(self):
+        if self.admitting and self.backlog > self.highWater:
+            self.admitting = False
+        elif not self.admitting and self.backlog < self.lowWater:
+            self.admitting = True
+            self.admit()
+
+    #### MESSAGES
+
+    def message(self, battleid, command):
+        """
+        Queues the message of a battle spectated by the manager.
+        Returns False for the battles it does not know of.
+        """
+        queue = self.queues.get(battleid)
+        if queue is None:
+            return battleid in self.finished
+        if len(queue) >= self.queueSize:
+            self.dropped += 1
+            self.finish(battleid)
+            return True
+        if battleid not in self.readyIds:
+            self.readyIds.add(battleid)
+            self.ready.append(battleid)
+        queue.append(command)
+        self.backlog += 1
+        if self.schedule is None:
+            self.process()
+            return True
+        self.update()
+        if not self.scheduled:
+            self.scheduled = True
+            self.schedule(self.process)
+        return True
+
+    def process(self, limit=None):
+        """
+        Handles the queued messages, at most limit of them, taking
+        one battle after the other. Returns the number handled.
+        """
+        self.scheduled = False
+        client = self.client
+        handled = 0
+        ready, readyIds = self.ready, self.readyIds
+        while ready and (limit is None or handled < limit):
+            battleid = ready.popleft()
+            queue = self.queues.get(battleid)
+            if not queue:
+                # removed since, its messages went with it
+                readyIds.discard(battleid)
+                continue
+            command = queue.popleft()
+            if queue:
+                ready.append(battleid)
+            else:
+                readyIds.discard(battleid)
+            self.backlog -= 1
+            handled += 1
+            client.handleBattleCommand(battleid, command)
+            client.onSpectatingBattleMessage(battleid, command)
+        self.update()
+        if self.backlog and self.schedule is not None:
+            self.scheduled = True
+            self.schedule(self.process)
+        return handled
@@ -0,0 +1,104 @@
+# test_asyncio.py
+# The asyncio interface over a loopback socket, needs trollius on python 2.
+# Run with: python -m unittest discover -s tests -t .
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+
+# the interfaces import the package as poprotocol
+_root = tempfile.mkdtemp()
+os.symlink(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), os.path.join(_root, "poprotocol"))
+sys.path.insert(0, _root)
+
+if asyncio is not None:
+    from poprotocol.interfaces.asyncio_interface import AsyncioClientProtocol, connect_many
+    from poprotocol.mockserver import MockServer
+
+    class ServerProtocol(asyncio.Protocol):
+        """ A MockConnection behind a socket """
+
+        def __init__(self, server):
+            self.server = server
+
+        def connection_made(self, transport):
+            self.connection = self.server.connect(lambda data: transport.write(bytes(data)))
+
+        def data_received(self, data):
+            self.connection.dataReceived(data)
+
+    class Client(AsyncioClientProtocol):
+        coalesce = True
+
+        def __init__(self, loop, done):
+            AsyncioClientProtocol.__init__(self, loop)
+            self.done = done
+            self.players = 0
+            self.channels = None
+
+        def onPlayersList(self, players):
+            self.players += len(players)
+
+        def onChannelsList(self, channels):
+            self.channels = channels
+
+        def onBattleList(self, channel, battles):
+            self.done.set_result(self)
+
+def tearDownModule():
+    sys.path.remove(_root)
+    shutil.rmtree(_root)
+
+@unittest.skipIf(asyncio is None, "needs asyncio or trollius")
+class AsyncioLoopbackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def test_login_many(self):
+        loop = self.loop
+        server = loop.run_until_complete(loop.create_server(
+            lambda: ServerProtocol(MockServer(players=300, battles=5)), "127.0.0.1", 0))
+        port = server.sockets[0].getsockname()[1]
+        done = []
+
+        def factory():
+            done.append(asyncio.Future(loop=loop))
+            return Client(loop, done[-1])
+
+        connections = loop.run_until_complete(connect_many(factory, "127.0.0.1", port, 3, loop))
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            for transport, client in connections:
+                client.login(u"bot")
+                # queued until the next iteration of the loop
+                self.assertTrue(client.frames)
+            # stopping the loop fails run_until_complete instead of hanging
+            timeout = loop.call_later(10, loop.stop)
+            clients = loop.run_until_complete(asyncio.gather(*done))
+            timeout.cancel()
+        finally:
+            sys.stdout = stdout
+        for client in clients:
+            self.assertEqual(client.players, 301)
+            self.assertEqual(len(client.channels), 10)
+            self.assertEqual(client.frames, [])
+        for transport, client in connections:
+            transport.close()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+
+if __name__ == "__main__":
+    unittest.main()
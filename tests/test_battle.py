@@ -0,0 +1,51 @@
+# test_battle.py
+# Battle command handling, run with: python -m unittest discover -s tests -t .
+
+import struct
+import unittest
+
+from protocol import POClient, NetworkEvents, BattleCommands
+from battlestate import BattleStates
+
+def spectating_message(battleid, command):
+    return struct.pack("!BiI", NetworkEvents['SpectatingBattleMessage'], battleid, len(command)) + command
+
+class Client(POClient):
+
+    def __init__(self):
+        self.events = []
+        self.battleStates = BattleStates()
+
+    def onBattleBeginTurn(self, bid, spot, turn):
+        self.events.append(('BeginTurn', bid, spot, turn))
+
+class LegacyClient(Client):
+
+    # overridden without battleCommandParser, as before parsers took a PODecoder
+    def on_Battle_SendOut(self, bid, spot, bytes):
+        self.events.append(('SendOut', bid, spot, bytes))
+
+class BattleCommandTest(unittest.TestCase):
+
+    def test_parsed_command(self):
+        client = Client()
+        client.dispatchFrame(spectating_message(3, struct.pack("!BBi", BattleCommands['BeginTurn'], 1, 7)))
+        self.assertEqual(client.events, [('BeginTurn', 3, 1, 7)])
+
+    def test_callback_on_instance(self):
+        client = Client()
+        turns = []
+        client.onBattleBeginTurn = lambda bid, spot, turn: turns.append(turn)
+        client.dispatchFrame(spectating_message(3, struct.pack("!BBi", BattleCommands['BeginTurn'], 1, 7)))
+        self.assertEqual((turns, client.events), ([7], []))
+
+    def test_undecorated_override_gets_bytes(self):
+        client = LegacyClient()
+        payload = "\x00\x02rest"
+        client.dispatchFrame(spectating_message(3, struct.pack("!BB", BattleCommands['SendOut'], 0) + payload))
+        self.assertEqual(client.events, [('SendOut', 3, 0, payload)])
+        # the command never reaches the battle state
+        self.assertFalse(3 in client.battleStates.states)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+# test_coalesce.py
+# Coalescing of outgoing frames, run with: python -m unittest discover -s tests -t .
+
+import unittest
+
+from protocol import POClient
+
+class Client(POClient):
+    coalesce = True
+    coalesceMaxBytes = 64
+
+    def __init__(self):
+        self.written = []
+        self.scheduled = []
+
+    def native_send(self, data):
+        self.written.append(bytes(data))
+
+    def scheduleFlush(self, delay):
+        self.scheduled.append(delay)
+
+class CoalesceTest(unittest.TestCase):
+
+    def test_queued_until_flush(self):
+        client = Client()
+        client.away(True)
+        client.spectateBattle(5)
+        self.assertEqual(client.written, [])
+        # only the first frame of a batch schedules a flush
+        self.assertEqual(client.scheduled, [0])
+        client.flush()
+        self.assertEqual(len(client.written), 1)
+        self.assertEqual(len(client.written[0]), 6 + 9)
+        client.flush()
+        self.assertEqual(len(client.written), 1)
+
+    def test_max_delay(self):
+        client = Client()
+        client.coalesceMaxDelay = 0.05
+        client.away(True)
+        self.assertEqual(client.scheduled, [0.05])
+
+    def test_max_bytes(self):
+        client = Client()
+        for k in range(7):
+            client.spectateBattle(k)
+        # 63 bytes queued
+        self.assertEqual(client.written, [])
+        client.spectateBattle(7)
+        self.assertEqual([len(data) for data in client.written], [72])
+        client.away(False)
+        self.assertEqual(client.scheduled, [0, 0])
+        client.flush()
+        self.assertEqual([len(data) for data in client.written], [72, 6])
+
+    def test_not_coalescing(self):
+        client = Client()
+        client.coalesce = False
+        client.away(True)
+        client.away(False)
+        self.assertEqual(len(client.written), 2)
+        self.assertEqual(client.scheduled, [])
+
+if __name__ == "__main__":
+    unittest.main()
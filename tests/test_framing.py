@@ -0,0 +1,83 @@
+# test_framing.py
+# FrameDecoder and FrameEncoder, run with: python -m unittest discover -s tests -t .
+
+import struct
+import unittest
+
+from framing import FrameDecoder, FrameEncoder, FramedProtocol
+
+def framed(*frames):
+    return "".join(struct.pack("!I", len(frame)) + frame for frame in frames)
+
+class Receiver(FramedProtocol):
+
+    def __init__(self):
+        FramedProtocol.__init__(self)
+        self.frames = []
+        self.reply = {}
+
+    def stringReceived(self, frame):
+        self.frames.append(frame)
+        if frame in self.reply:
+            # data arriving while a frame is handled, e.g. a handler
+            # pumping the transport
+            self.dataReceived(self.reply.pop(frame))
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def test_split_everywhere(self):
+        data = framed("first", "", "third frame")
+        for cut in range(len(data) + 1):
+            decoder = FrameDecoder()
+            frames = list(decoder.feed(data[:cut])) + list(decoder.feed(data[cut:]))
+            self.assertEqual(frames, ["first", "", "third frame"])
+            self.assertEqual(decoder.pending(), 0)
+
+    def test_byte_by_byte(self):
+        data = framed("abc", "defg")
+        decoder = FrameDecoder()
+        frames = []
+        for k in range(len(data)):
+            frames.extend(decoder.feed(data[k]))
+            if k < 3:
+                # only part of the length prefix so far
+                self.assertEqual(frames, [])
+        self.assertEqual(frames, ["abc", "defg"])
+
+    def test_pending(self):
+        decoder = FrameDecoder()
+        self.assertEqual(list(decoder.feed(framed("abc") + "\0\0\0\x05ab")), ["abc"])
+        self.assertEqual(decoder.pending(), 6)
+
+    def test_compaction(self):
+        decoder = FrameDecoder()
+        decoder.compactThreshold = 16
+        frames = []
+        for k in range(10):
+            frames.extend(decoder.feed(framed("x" * 10) + "\0\0"))
+            frames.extend(decoder.feed("\0\x01y"))
+        self.assertEqual(frames, ["x" * 10, "y"] * 10)
+        self.assertTrue(len(decoder.buffer) < 16 + 17)
+
+    def test_reentrant_feed(self):
+        receiver = Receiver()
+        receiver.reply["one"] = framed("three") + "\0\0"
+        receiver.reply["two"] = "\0\x04four"
+        receiver.dataReceived(framed("one", "two"))
+        self.assertEqual(receiver.frames, ["one", "two", "three", "four"])
+        self.assertEqual(receiver.frameDecoder.pending(), 0)
+
+class FrameEncoderTest(unittest.TestCase):
+
+    def test_take(self):
+        encoder = FrameEncoder(4)
+        encoder.write("abc")
+        encoder.writeFrame(framed("de"))
+        self.assertEqual(len(encoder), 13)
+        self.assertEqual(encoder.take(), framed("abc", "de"))
+        self.assertEqual(len(encoder), 0)
+        encoder.write("f")
+        self.assertEqual(encoder.take(), framed("f"))
+
+if __name__ == "__main__":
+    unittest.main()
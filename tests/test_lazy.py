@@ -0,0 +1,56 @@
+# test_lazy.py
+# LazyPlayerInfo, run with: python -m unittest discover -s tests -t .
+
+import unittest
+
+from protocol import PODecoder, Color, NetworkEvents
+from mockserver import MockPlayer, ServerWriter
+from world import World
+
+def players_list(*players):
+    w = ServerWriter()
+    w.write_number("B", NetworkEvents['PlayersList'])
+    for player in players:
+        w.write_PlayerInfo(player)
+    return str(w.getvalue())
+
+def decode_lazy(frame):
+    cmd = PODecoder(frame)
+    cmd.decode_number("B")
+    return cmd.decode_LazyPlayerInfo()
+
+class LazyPlayerInfoTest(unittest.TestCase):
+
+    def test_fields_decoded_on_access(self):
+        player = decode_lazy(players_list(MockPlayer(7, u"seven")))
+        self.assertEqual((player.id, player.name), (7, u"seven"))
+        self.assertEqual(player.colorFields(), (1, 255, 7, 128, 64))
+        self.assertEqual(player.info, u"Trainer seven")
+        self.assertEqual(player.colorFields(), (1, 255, 7, 128, 64))
+
+    def test_skip_policy_kept(self):
+        cmd = PODecoder(players_list(MockPlayer(7, u"seven")), ("Color",))
+        cmd.decode_number("B")
+        player = cmd.decode_LazyPlayerInfo()
+        self.assertEqual(player.info, u"Trainer seven")
+        self.assertEqual(player.color, None)
+
+    def test_update_replaces_the_frame(self):
+        old = MockPlayer(7, u"seven")
+        new = MockPlayer(7, u"seven")
+        new.info = u"new team"
+        new.color = Color(1, 255, 1, 2, 3, 0)
+        world = World()
+        world.updatePlayer(decode_lazy(players_list(old)))
+        # e.g. SendTeam, decoded eagerly
+        cmd = PODecoder(players_list(new))
+        cmd.decode_number("B")
+        world.updatePlayer(cmd.decode_PlayerInfo())
+        player = world.players[7]
+        self.assertEqual(player.colorFields(), (1, 255, 1, 2, 3))
+        player.materialize()
+        self.assertEqual(player.info, u"new team")
+        self.assertEqual(player.colorFields(), (1, 255, 1, 2, 3))
+
+if __name__ == "__main__":
+    unittest.main()
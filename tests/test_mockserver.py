@@ -0,0 +1,122 @@
+# test_mockserver.py
+# A client against the mock server, recorded and replayed.
+# Run with: python -m unittest discover -s tests -t .
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from framing import FramedProtocol
+from protocol import POClient
+from mockserver import MockServer, connect
+from world import World
+from battlestate import BattleStates
+from capture import Recorder, Capture, replay, INBOUND, OUTBOUND
+
+class Client(FramedProtocol, POClient):
+
+    def __init__(self):
+        FramedProtocol.__init__(self)
+        self.world = World()
+        self.battleStates = BattleStates()
+        self.me = None
+        self.players = 0
+        self.channels = []
+        self.battles = {}
+        self.chat = []
+        self.turns = []
+
+    def onLogin(self, player):
+        self.me = player.id
+
+    def onPlayersList(self, players):
+        self.players += len(players)
+
+    def onChannelsList(self, channels):
+        self.channels = channels
+
+    def onBattleList(self, channel, battles):
+        self.battles.update(battles)
+
+    def onChannelMessage(self, chanid, user, message):
+        self.chat.append((chanid, user, message))
+
+    def onBattleBeginTurn(self, bid, spot, turn):
+        self.turns.append((bid, turn))
+
+def login(client, name=u"bot"):
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+        client.login(name)
+    finally:
+        sys.stdout = stdout
+
+class MockServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def session(self, client, **kwargs):
+        server = MockServer(players=600, channels=5, battles=20, playersPerFrame=256, **kwargs)
+        connection = connect(server, client)
+        login(client)
+        return server, connection
+
+    def check_login(self, client):
+        self.assertEqual(client.players, 601)
+        self.assertEqual(len(client.world.players), 601)
+        self.assertEqual(client.world.me, client.me)
+        self.assertEqual(len(client.channels), 5)
+        self.assertEqual(len(client.battles), 20)
+        self.assertEqual(len(client.world.channelPlayers[0]), 601)
+
+    def test_login(self):
+        client = Client()
+        self.session(client)
+        self.check_login(client)
+
+    def test_login_compressed(self):
+        client = Client()
+        # the login burst is one ZipCommand above zipChunkSize
+        client.zipChunkSize = 4096
+        self.session(client, compress=True)
+        self.check_login(client)
+
+    def test_traffic(self):
+        client = Client()
+        server, connection = self.session(client)
+        battleid = sorted(client.battles)[0]
+        client.spectateBattle(battleid)
+        connection.advance(4.0)
+        self.assertEqual(len(client.chat), 40)
+        self.assertEqual(client.turns[:2], [(battleid, 1), (battleid, 2)])
+        self.assertTrue(battleid in client.battleStates.states)
+        client.sendChannelMessage(0, u"hello")
+        self.assertEqual(client.chat[-1], (0, u"bot", u"hello"))
+        client.partChannel(0)
+        self.assertEqual(client.world.channelPlayers[0], set())
+
+    def test_record_and_replay(self):
+        path = os.path.join(self.dir, "session.pocap")
+        client = Client()
+        client.recorder = Recorder(path)
+        server, connection = self.session(client, compress=True)
+        connection.advance(1.0)
+        client.recorder.close()
+        records = list(Capture(path))
+        self.assertEqual(records[0][1], OUTBOUND)
+        self.assertEqual(client.recorder.frames, len(records))
+
+        replayed = Client()
+        replayed.native_send = lambda data: None
+        frames, total, seconds = replay(replayed, path)
+        self.assertEqual(frames, len([r for r in records if r[1] == INBOUND]))
+        self.check_login(replayed)
+        self.assertEqual(replayed.chat, client.chat)
+
+if __name__ == "__main__":
+    unittest.main()
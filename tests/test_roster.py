@@ -0,0 +1,44 @@
+# test_roster.py
+# PlayerTable, run with: python -m unittest discover -s tests -t .
+
+import unittest
+
+from protocol import PlayerInfo
+from roster import PlayerTable
+
+def player(playerid, auth=0, away=False):
+    p = PlayerInfo()
+    p.id = playerid
+    p.name = u"player%d" % playerid
+    p.auth = auth
+    p.away = away
+    return p
+
+class PlayerTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = PlayerTable()
+        self.table.extend([player(1), player(2, auth=1, away=True), player(3, away=True)])
+
+    def test_select(self):
+        table = self.table
+        self.assertEqual(table.select(table.awayMask()), [2, 3])
+        self.assertEqual(table.select(table.awayMask(), table.authMask(1)), [2])
+        self.assertEqual(table.select(table.awayMask(False)), [1])
+
+    def test_remove_moves_the_last_row(self):
+        table = self.table
+        table.remove(1)
+        self.assertEqual(list(table.ids), [3, 2])
+        self.assertEqual(table.name(3), u"player3")
+        self.assertEqual(table.row(2), 1)
+
+    def test_masks_are_copies(self):
+        table = self.table
+        mask = table.awayMask()
+        mask[0] = 1
+        self.assertEqual(list(table.away), [0, 1, 1])
+        self.assertEqual(table.select(table.awayMask()), [2, 3])
+
+if __name__ == "__main__":
+    unittest.main()
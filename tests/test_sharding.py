@@ -0,0 +1,44 @@
+# test_sharding.py
+# BattleShards, run with: python -m unittest discover -s tests -t .
+
+import struct
+import unittest
+
+from protocol import POClient, BattleCommands
+from sharding import BattleShards
+
+class Client(POClient):
+
+    def __init__(self):
+        self.turns = []
+        self.errors = []
+
+    def onBattleBeginTurn(self, bid, spot, turn):
+        self.turns.append((bid, turn))
+
+    def on_Battle_Ko(self, bid, spot, cmd):
+        raise ValueError("malformed")
+
+    def onBattleParseError(self, battleid, payload, error):
+        self.errors.append((battleid, error))
+
+class BattleShardsTest(unittest.TestCase):
+
+    def test_order_and_errors(self):
+        client = Client()
+        shards = client.battleShards = BattleShards(Client, workers=2, batchSize=4, maxErrors=2)
+        shards.start()
+        self.addCleanup(shards.close)
+        for turn in range(1, 11):
+            for battleid in (1, 2):
+                client.handleBattleCommand(battleid, struct.pack("!BBi", BattleCommands['BeginTurn'], 0, turn))
+        for k in range(3):
+            client.handleBattleCommand(3, struct.pack("!BB", BattleCommands['Ko'], 0))
+        shards.join(client)
+        for battleid in (1, 2):
+            self.assertEqual([turn for bid, turn in client.turns if bid == battleid], range(1, 11))
+        self.assertEqual(client.errors, [(3, "ValueError('malformed',)")] * 3)
+        self.assertEqual(len(shards.errors), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+# test_skip.py
+# skippedStructures, run with: python -m unittest discover -s tests -t .
+
+import sys
+import unittest
+from StringIO import StringIO
+
+from framing import FramedProtocol
+from protocol import POClient
+from mockserver import MockServer, connect
+from world import World
+
+class Client(FramedProtocol, POClient):
+    skippedStructures = ("PlayerInfo",)
+
+    def __init__(self):
+        FramedProtocol.__init__(self)
+        self.world = World()
+        self.me = None
+        self.players = []
+
+    def onLogin(self, player):
+        self.me = player
+
+    def onPlayersList(self, players):
+        self.players.extend(players)
+
+class SkipTest(unittest.TestCase):
+
+    def test_skipped_player_info(self):
+        client = Client()
+        connect(MockServer(players=10, battles=0), client)
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            client.login(u"bot")
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(client.me.name, u"bot")
+        self.assertEqual(client.world.me, client.me.id)
+        self.assertEqual(client.players, [None] * 11)
+        self.assertEqual(client.world.players.keys(), [client.me.id])
+
+if __name__ == "__main__":
+    unittest.main()
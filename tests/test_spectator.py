@@ -0,0 +1,79 @@
+# test_spectator.py
+# SpectatorManager, run with: python -m unittest discover -s tests -t .
+
+import struct
+import unittest
+
+from protocol import POClient, NetworkEvents, BattleCommands
+from battlestate import BattleStates
+from spectator import SpectatorManager
+
+def spectating_message(battleid, command):
+    return struct.pack("!BiI", NetworkEvents['SpectatingBattleMessage'], battleid, len(command)) + command
+
+def begin_turn(turn):
+    return struct.pack("!BBi", BattleCommands['BeginTurn'], 0, turn)
+
+class Client(POClient):
+
+    def __init__(self):
+        self.spectated = []
+        self.finished = []
+        self.messages = []
+
+    def spectateBattle(self, battleid):
+        self.spectated.append(battleid)
+
+    def spectatingBattleFinished(self, battleid):
+        self.finished.append(battleid)
+
+    def onSpectatingBattleMessage(self, battleid, command):
+        self.messages.append(battleid)
+
+class SpectatorManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.client.battleStates = BattleStates()
+        self.client.spectators = SpectatorManager(self.client, maxBattles=1, queueSize=2,
+                                                  schedule=lambda process: None)
+
+    def test_admission(self):
+        spectators = self.client.spectators
+        spectators.offer(0, 1, 10, 11)
+        spectators.offer(0, 2, 12, 13)
+        self.assertEqual(self.client.spectated, [1])
+        spectators.finish(1)
+        self.assertEqual(self.client.spectated, [1, 2])
+        self.assertEqual(self.client.finished, [1])
+
+    def test_queued_until_processed(self):
+        spectators = self.client.spectators
+        spectators.offer(0, 1, 10, 11)
+        self.client.dispatchFrame(spectating_message(1, begin_turn(1)))
+        self.assertEqual(self.client.messages, [])
+        self.assertEqual(spectators.process(), 1)
+        self.assertEqual(self.client.messages, [1])
+
+    def test_unmanaged_battle_handled_directly(self):
+        self.client.spectateBattle(5)
+        self.client.dispatchFrame(spectating_message(5, begin_turn(1)))
+        self.assertEqual(self.client.messages, [5])
+        self.assertTrue(5 in self.client.battleStates.states)
+
+    def test_overflow_drops_the_state(self):
+        spectators = self.client.spectators
+        spectators.offer(0, 1, 10, 11)
+        self.client.dispatchFrame(spectating_message(1, begin_turn(1)))
+        spectators.process()
+        self.assertTrue(1 in self.client.battleStates.states)
+        for turn in range(2, 6):
+            self.client.dispatchFrame(spectating_message(1, begin_turn(turn)))
+        self.assertEqual(spectators.dropped, 1)
+        self.assertEqual(self.client.finished, [1])
+        self.assertFalse(1 in self.client.battleStates.states)
+        # the late messages of the battle given up are swallowed
+        self.assertEqual(self.client.messages, [1])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+# test_zip.py
+# ZipCommand inflating, run with: python -m unittest discover -s tests -t .
+
+import os
+import zlib
+import struct
+import unittest
+
+from protocol import POClient, NetworkEvents
+
+class Client(POClient):
+
+    def __init__(self):
+        self.frames = []
+        self.errors = 0
+
+    def dispatchFrame(self, cmd):
+        if cmd[:1] == chr(NetworkEvents['ZipCommand']):
+            POClient.dispatchFrame(self, cmd)
+        else:
+            self.frames.append(cmd)
+
+    def on_ProtocolError(self, ev, cmd):
+        self.errors += 1
+
+def zip_command(contentType, data, size=None, level=6):
+    size = len(data) if size is None else size
+    return struct.pack("!BBI", NetworkEvents['ZipCommand'], contentType, size) + zlib.compress(data, level)
+
+def length_prefixed(frames):
+    return "".join(struct.pack("!I", len(frame)) + frame for frame in frames)
+
+class ZipCommandTest(unittest.TestCase):
+
+    def receive(self, zipped):
+        client = Client()
+        client.dispatchFrame(zipped)
+        return client
+
+    def test_one_command_above_chunk_size(self):
+        command = os.urandom(POClient.zipChunkSize * 2 + 17)
+        client = self.receive(zip_command(0, command))
+        self.assertEqual(client.frames, [command])
+        self.assertEqual(client.errors, 0)
+
+    def test_sequence_above_chunk_size(self):
+        frames = [os.urandom(30000) for k in range(7)]
+        client = self.receive(zip_command(1, length_prefixed(frames)))
+        self.assertEqual(client.frames, frames)
+        self.assertEqual(client.errors, 0)
+
+    def test_sequence_below_chunk_size(self):
+        frames = ["\x05abc", "\x0cdef"]
+        client = self.receive(zip_command(1, length_prefixed(frames)))
+        self.assertEqual(client.frames, frames)
+        self.assertEqual(client.errors, 0)
+
+    def test_data_past_the_stream_is_ignored(self):
+        command = os.urandom(POClient.zipChunkSize + 1)
+        client = self.receive(zip_command(0, command) + "junk")
+        self.assertEqual(client.frames, [command])
+        self.assertEqual(client.errors, 0)
+
+    def test_truncated_trailer(self):
+        command = os.urandom(POClient.zipChunkSize + 1)
+        frames = [os.urandom(30000) for k in range(3)]
+        for cut in range(1, 5):
+            client = self.receive(zip_command(0, command)[:-cut])
+            self.assertEqual((client.frames, client.errors), ([], 1))
+            client = self.receive(zip_command(1, length_prefixed(frames))[:-cut])
+            self.assertEqual(client.errors, 1)
+
+    def test_size_exceeded(self):
+        data = length_prefixed([os.urandom(30000) for k in range(3)])
+        for contentType in (0, 1):
+            client = self.receive(zip_command(contentType, data, len(data) - 1))
+            self.assertEqual(client.errors, 1)
+
+    def test_too_short(self):
+        client = self.receive(chr(NetworkEvents['ZipCommand']))
+        self.assertEqual((client.frames, client.errors), ([], 1))
+
+if __name__ == "__main__":
+    unittest.main()
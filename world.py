@@ -0,0 +1,215 @@
+# world.py
+# Client side state of a Pokemon Online server
+#
+# Licensed under BSD-style license.
+# See LICENSE for details
+
+"""
+World keeps what the server told the client about players, channels and
+battles, with the indexes handlers otherwise re-derive by scanning:
+
+    playerChannels : {playerid: set of chanid}
+    channelPlayers : {chanid: set of playerid}
+    battleChannels : {battleid: set of chanid}
+    playerBattles : {playerid: set of battleid}
+    channelBattles : {chanid: set of battleid}
+
+Each update touches only the entries of the player, channel or battle
+the event is about.
+
+World.names indexes the players by their normalized name.
+
+World.me is the id of our own player, set at Login. When we leave a
+channel the server stops telling about it, so its players and battles
+are forgotten.
+"""
+
+import bisect
+import unicodedata
+
+from protocol import Channel
+
+def normalize(name):
+    """ The form player names are compared in: NFKC, stripped, lower case """
+    if isinstance(name, str):
+        name = name.decode("utf-8")
+    return unicodedata.normalize("NFKC", name).strip().lower()
+
+class NameIndex(object):
+    """
+    Normalized name -> player id, with a sorted list of the normalized
+    names for prefix searches.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.keys = {}
+        self.sorted = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, name, default=None):
+        """ Id of the player called name """
+        return self.ids.get(normalize(name), default)
+
+    def add(self, playerid, name):
+        """ Indexes playerid under name, forgetting its previous name """
+        key = normalize(name)
+        old = self.keys.get(playerid)
+        if old == key:
+            return
+        if old is not None:
+            self.remove(playerid)
+        other = self.ids.get(key)
+        if other is not None:
+            # the name was taken by a player we missed the logout of
+            del self.keys[other]
+        else:
+            bisect.insort(self.sorted, key)
+        self.ids[key] = playerid
+        self.keys[playerid] = key
+
+    def remove(self, playerid):
+        key = self.keys.pop(playerid, None)
+        if key is None:
+            return
+        del self.ids[key]
+        del self.sorted[bisect.bisect_left(self.sorted, key)]
+
+    def startingWith(self, prefix, limit=None):
+        """ Ids of the players whose name starts with prefix, in name order """
+        prefix = normalize(prefix)
+        found = []
+        k = bisect.bisect_left(self.sorted, prefix)
+        while k < len(self.sorted) and self.sorted[k].startswith(prefix):
+            if limit is not None and len(found) >= limit:
+                break
+            found.append(self.ids[self.sorted[k]])
+            k += 1
+        return found
+
+class World(object):
+
+    def __init__(self):
+        self.players = {}
+        self.channels = {}
+        self.battles = {}
+        self.playerChannels = {}
+        self.channelPlayers = {}
+        self.battleChannels = {}
+        self.playerBattles = {}
+        self.channelBattles = {}
+        self.names = NameIndex()
+        self.me = None
+
+    #### PLAYERS
+
+    def updatePlayer(self, player):
+        """ Adds the PlayerInfo player, or updates the one known """
+        known = self.players.get(player.id)
+        if known is None:
+            self.players[player.id] = player
+        else:
+            known.update(player)
+        self.names.add(player.id, player.name)
+
+    def playerByName(self, name):
+        """ The PlayerInfo of the player called name, None if unknown """
+        return self.players.get(self.names.get(name))
+
+    def logout(self, playerid):
+        self.players.pop(playerid, None)
+        self.names.remove(playerid)
+        for chanid in self.playerChannels.pop(playerid, ()):
+            players = self.channelPlayers.get(chanid)
+            if players is not None:
+                players.discard(playerid)
+        # the battles of a player gone are over
+        for battleid in list(self.playerBattles.get(playerid, ())):
+            self.finishBattle(battleid)
+
+    #### CHANNELS
+
+    def addChannel(self, chanid, name):
+        channel = self.channels.get(chanid)
+        if channel is None:
+            channel = self.channels[chanid] = Channel(chanid, name)
+            # the channel shares its set of players with the index
+            channel.players = self.channelPlayers.setdefault(chanid, set())
+        else:
+            channel.name = name
+
+    def removeChannel(self, chanid):
+        self.channels.pop(chanid, None)
+        self.forgetChannel(chanid)
+        self.channelPlayers.pop(chanid, None)
+
+    def forgetChannel(self, chanid):
+        """ Drops the players and battles known in the channel """
+        for playerid in list(self.channelPlayers.get(chanid, ())):
+            self._leave(chanid, playerid)
+        for battleid in self.channelBattles.pop(chanid, ()):
+            channels = self.battleChannels.get(battleid)
+            if channels is not None:
+                channels.discard(chanid)
+                if not channels:
+                    del self.battleChannels[battleid]
+
+    def join(self, chanid, playerid):
+        self.playerChannels.setdefault(playerid, set()).add(chanid)
+        self.channelPlayers.setdefault(chanid, set()).add(playerid)
+
+    def leave(self, chanid, playerid):
+        if playerid == self.me:
+            # no later event updates the channel
+            self.forgetChannel(chanid)
+        else:
+            self._leave(chanid, playerid)
+
+    def _leave(self, chanid, playerid):
+        channels = self.playerChannels.get(playerid)
+        if channels is not None:
+            channels.discard(chanid)
+            if not channels:
+                del self.playerChannels[playerid]
+        players = self.channelPlayers.get(chanid)
+        if players is not None:
+            players.discard(playerid)
+
+    def setChannelPlayers(self, chanid, playerids):
+        """ The players of the channel are playerids, and only them """
+        playerids = set(playerids)
+        for playerid in list(self.channelPlayers.get(chanid, ())):
+            if playerid not in playerids:
+                self._leave(chanid, playerid)
+        for playerid in playerids:
+            self.join(chanid, playerid)
+
+    #### BATTLES
+
+    def addBattle(self, chanid, battleid, player1, player2):
+        self.battles[battleid] = (player1, player2)
+        # a battle is announced in every channel of its players
+        self.battleChannels.setdefault(battleid, set()).add(chanid)
+        self.channelBattles.setdefault(chanid, set()).add(battleid)
+        self.playerBattles.setdefault(player1, set()).add(battleid)
+        self.playerBattles.setdefault(player2, set()).add(battleid)
+
+    def addBattles(self, chanid, battles):
+        """ battles : {battleid: (player1, player2)} as given by BattleList """
+        for battleid, (player1, player2) in battles.iteritems():
+            self.addBattle(chanid, battleid, player1, player2)
+
+    def finishBattle(self, battleid):
+        players = self.battles.pop(battleid, ())
+        for playerid in players:
+            battles = self.playerBattles.get(playerid)
+            if battles is not None:
+                battles.discard(battleid)
+                if not battles:
+                    del self.playerBattles[playerid]
+        for chanid in self.battleChannels.pop(battleid, ()):
+            battles = self.channelBattles.get(chanid)
+            if battles is not None:
+                battles.discard(battleid)